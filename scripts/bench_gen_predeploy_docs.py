@@ -0,0 +1,292 @@
+"""
+End-to-end benchmark of gen_predeploy_docs.py. The generator is run as a subprocess against a synthetic
+Optimism repo whose `make build-contracts` calls a stub `forge` that writes artifacts of realistic size,
+a stub `cast`, and an in-process JSON-RPC stand-in with configurable latency, so runs are reproducible
+without the real Optimism repo or network access. Every run is traced with --trace, and the report holds
+the wall time, the time to first work (until the generator logs its first line, after startup, argument
+parsing and dependency checks) and per-phase totals of each scenario.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+GENERATOR = os.path.join(SCRIPT_DIR, "gen_predeploy_docs.py")
+
+FROM_ADDRESS = "0x4210000000000000000000000000000000000006"
+
+STUB_FORGE = """#!{python}
+import hashlib, json, os, sys, time
+if "--version" in sys.argv:
+    print("forge 0.0.0-bench")
+    sys.exit()
+# The profile the generator checks selectively built artifacts against
+if sys.argv[1:3] == ["config", "--json"]:
+    print(json.dumps({{"solc": "0.8.15", "optimizer": True, "optimizer_runs": 999999, "via_ir": False,
+                      "evm_version": "cancun", "bytecode_hash": "none", "remappings": []}}))
+    sys.exit()
+# A full build compiles the whole workspace; `forge build <sources>` only the given files
+sources = [arg for arg in sys.argv[2:] if arg.endswith(".sol")]
+names = [os.path.basename(source)[:-4] for source in sources] or open("contracts.txt").read().split()
+build_seconds = float(os.environ.get("BENCH_BUILD_SECONDS", "0"))
+time.sleep(build_seconds * len(sources) / int(os.environ["BENCH_WORKSPACE_SOURCES"]) if sources else build_seconds)
+bytecode_size = int(os.environ["BENCH_BYTECODE_KB"]) * 1024
+artifact_size = int(os.environ["BENCH_ARTIFACT_KB"]) * 1024
+for name in names:
+    seed = hashlib.sha256((name + open("salt.txt").read()).encode()).digest()
+    runtime = (seed * (bytecode_size // len(seed) + 1))[:bytecode_size].hex()
+    abi = [{{"type": "function", "name": f"fn{{i}}", "inputs": [{{"name": "x", "type": "uint256"}}],
+            "outputs": [{{"name": "", "type": "bytes32"}}], "stateMutability": "view"}} for i in range(40)]
+    artifact = {{
+        "abi": abi,
+        # Init code that returns the runtime code, so the evm gas backend can execute it too
+        "bytecode": {{"object": "0x61" + format(len(runtime) // 2, "04x") + "80600c6000396000f3" + runtime}},
+        "deployedBytecode": {{"object": "0x6080" + runtime}},
+        "methodIdentifiers": {{f"fn{{i}}(uint256)": seed[:4].hex() for i in range(40)}},
+        "metadata": {{"compiler": {{"version": "0.8.15+commit.e14f2714"}},
+                     "settings": {{"optimizer": {{"enabled": True, "runs": 999999}}, "evmVersion": "cancun",
+                                  "metadata": {{"bytecodeHash": "none"}}, "remappings": []}}}},
+    }}
+    # The AST and sourcemaps make up most of a real artifact
+    artifact["ast"] = {{"nodes": "x" * max(0, artifact_size - len(json.dumps(artifact)))}}
+    out_dir = os.path.join("forge-artifacts", name + ".sol")
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, name + ".json"), "w") as f:
+        json.dump(artifact, f)
+"""
+
+STUB_CAST = """#!{python}
+import sys
+if sys.argv[1:2] == ["--version"]:
+    print("cast 0.0.0-bench")
+elif sys.argv[1:2] == ["abi-encode"]:
+    print("0x" + "".join(arg.rjust(64, "0") for arg in sys.argv[3:]))
+else:
+    sys.exit("unsupported stub cast command: " + " ".join(sys.argv[1:]))
+"""
+
+def run(command, cwd=None, env=None):
+    """Runs a setup command, failing loudly."""
+    subprocess.run(command, cwd=cwd, env=env, check=True, capture_output=True, text=True)
+
+def write_executable(path, content):
+    with open(path, "w") as f:
+        f.write(content.format(python=sys.executable))
+    os.chmod(path, 0o755)
+
+def contract_names(count):
+    return [f"BenchContract{i}" for i in range(count)]
+
+def create_workspace(root, args):
+    """Creates the stub tools, the synthetic Optimism repo and an upgrade config under root."""
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    write_executable(os.path.join(bin_dir, "forge"), STUB_FORGE)
+    write_executable(os.path.join(bin_dir, "cast"), STUB_CAST)
+
+    repo_dir = os.path.join(root, "optimism")
+    bedrock_dir = os.path.join(repo_dir, "packages", "contracts-bedrock")
+    os.makedirs(bedrock_dir)
+    with open(os.path.join(repo_dir, "Makefile"), "w") as f:
+        f.write("build-contracts:\n\tcd packages/contracts-bedrock && forge build\n")
+    with open(os.path.join(bedrock_dir, "contracts.txt"), "w") as f:
+        f.write("\n".join(contract_names(args.contracts)) + "\n")
+    with open(os.path.join(bedrock_dir, "salt.txt"), "w") as f:
+        f.write("bench\n")
+    os.makedirs(os.path.join(bedrock_dir, "src", "L2"))
+    for name in contract_names(args.contracts):
+        with open(os.path.join(bedrock_dir, "src", "L2", f"{name}.sol"), "w") as f:
+            f.write(f"// SPDX-License-Identifier: MIT\npragma solidity 0.8.15;\n\ncontract {name} {{}}\n")
+    with open(os.path.join(bedrock_dir, "foundry.toml"), "w") as f:
+        f.write("[profile.default]\noptimizer_runs = 999999\n")
+    with open(os.path.join(repo_dir, ".gitignore"), "w") as f:
+        f.write("forge-artifacts/\n")
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    run(git + ["init", "-q"], cwd=repo_dir)
+    run(git + ["add", "-A"], cwd=repo_dir)
+    run(git + ["commit", "-q", "-m", "bench"], cwd=repo_dir)
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir, check=True,
+                            capture_output=True, text=True).stdout.strip()
+
+    config_path = os.path.join(root, "bench.sh")
+    with open(config_path, "w") as f:
+        f.write(f"GIT_COMMIT_HASH={commit}\nFROM_ADDRESS_NONCE=0\nFROM_ADDRESS={FROM_ADDRESS}\nFORK_NAME=Bench\n")
+        f.write("declare -a contracts=(\n")
+        for index, name in enumerate(contract_names(args.contracts)):
+            f.write(f'    "{name}:0x42000000000000000000000000000000000000{index + 16:02x}"\n')
+        f.write(")\n")
+    return bin_dir, repo_dir, config_path, commit
+
+class RpcHandler(BaseHTTPRequestHandler):
+    """JSON-RPC stand-in for a remote node: estimates gas from the init code size after a fixed latency."""
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def handle_call(self, request):
+        method, params = request["method"], request.get("params", [])
+        if method == "eth_estimateGas":
+            result = hex(53000 + len(params[0]["data"]) * 8)
+        elif method == "eth_getTransactionCount":
+            result = "0x0"
+        elif method == "eth_getCode":
+            result = "0x"
+        elif method == "eth_chainId":
+            result = "0xa"
+        else:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "method not found"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        response = [self.handle_call(r) for r in request] if isinstance(request, list) else self.handle_call(request)
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_rpc(latency_ms):
+    RpcHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RpcHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def scenarios(repo_dir, config_path, commit, rpc_url):
+    """
+    Returns the benchmarked scenarios as (name, argv, is_batch) tuples. Each scenario starts from empty
+    caches and no lockfile, and one unmeasured run warms whatever the scenario leaves enabled.
+    """
+    batch = ["batch", "--upgrade-config", config_path, "--optimism-repo-path", repo_dir, "--eth-rpc-url", rpc_url]
+    single = ["--optimism-repo-path", repo_dir, "--fork-name", "Bench", "--contract-name", contract_names(1)[0],
+              "--from-address", FROM_ADDRESS, "--from-address-nonce", "0", "--git-commit-hash", commit,
+              "--eth-rpc-url", rpc_url, "--proxy-address", "0x4200000000000000000000000000000000000010"]
+    return [
+        ("batch-cold", batch + ["--no-artifact-cache", "--no-gas-cache", "--no-lockfile"], True),
+        ("batch-cold-full-build", batch + ["--no-artifact-cache", "--no-gas-cache", "--no-lockfile", "--build-mode", "full"], True),
+        ("batch-warm-cache", batch + ["--no-lockfile"], True),
+        ("batch-lockfile", batch, True),
+        ("single-cold", single + ["--no-artifact-cache", "--no-gas-cache"], False),
+        ("single-warm", single, False),
+    ]
+
+def run_generator(argv, env, cwd, trace_path):
+    """Runs the generator once and returns its wall time, time to its first log line, phase totals and stdout."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, GENERATOR] + argv + ["--trace", trace_path], env=env, cwd=cwd,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stderr_lines = []
+    reader = threading.Thread(target=lambda: stderr_lines.extend((time.perf_counter(), line) for line in process.stderr))
+    reader.start()
+    stdout = process.stdout.read()
+    reader.join()
+    wall = time.perf_counter() - start
+    if process.wait() != 0:
+        sys.exit(f"Generator failed ({' '.join(argv[:1])}):\n{''.join(line for _, line in stderr_lines)}")
+    first_work = stderr_lines[0][0] - start if stderr_lines else wall
+    with open(trace_path) as f:
+        return wall, first_work, json.load(f)["phaseTotals"], stdout
+
+def summarize(samples):
+    walls = [wall for wall, _, _ in samples]
+    first_works = [first_work for _, first_work, _ in samples]
+    phases = {}
+    for _, _, totals in samples:
+        for phase, total in totals.items():
+            phases.setdefault(phase, []).append(total["total_ms"])
+    return {
+        "runs": len(samples),
+        "wall_ms": {"median": round(statistics.median(walls) * 1000, 3), "min": round(min(walls) * 1000, 3)},
+        "first_work_ms": {"median": round(statistics.median(first_works) * 1000, 3), "min": round(min(first_works) * 1000, 3)},
+        "phase_median_ms": {phase: round(statistics.median(values), 3) for phase, values in sorted(phases.items())},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gen_predeploy_docs.py end to end against stub tools and synthetic artifacts.")
+    parser.add_argument("--contracts", type=int, default=8, help="Number of contracts in the synthetic upgrade config.")
+    parser.add_argument("--bytecode-kb", type=int, default=12, help="Runtime bytecode size of each synthetic contract.")
+    parser.add_argument("--artifact-kb", type=int, default=1500, help="Size of each synthetic forge artifact, mostly AST.")
+    parser.add_argument("--build-seconds", type=float, default=1.0, help="Time the stub forge takes to compile the whole workspace, standing in for compilation.")
+    parser.add_argument("--workspace-sources", type=int, default=600, help="Number of sources in the synthetic workspace; a selective build takes its share of --build-seconds.")
+    parser.add_argument("--rpc-latency-ms", type=float, default=50.0, help="Latency of each call to the JSON-RPC stand-in.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of measured runs per scenario.")
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario(s).")
+    parser.add_argument("--output", type=str, default="-", help="Path of the JSON report, or '-' for stdout.")
+    parser.add_argument("--compare", type=str, help="A previous JSON report to compare median wall times against.")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="op-specs-bench-")
+    server = None
+    try:
+        bin_dir, repo_dir, config_path, commit = create_workspace(root, args)
+        server, rpc_url = start_rpc(args.rpc_latency_ms)
+        cache_root = os.path.join(root, "cache")
+        env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""), HOME=root,
+                   XDG_CACHE_HOME=cache_root, BENCH_BUILD_SECONDS=str(args.build_seconds),
+                   BENCH_WORKSPACE_SOURCES=str(args.workspace_sources),
+                   BENCH_BYTECODE_KB=str(args.bytecode_kb), BENCH_ARTIFACT_KB=str(args.artifact_kb))
+        trace_path = os.path.join(root, "trace.json")
+
+        report = {
+            "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "scenario")},
+            "python": sys.version.split()[0],
+            "scenarios": {},
+        }
+        batch_outputs = set()
+        lockfile = os.path.splitext(config_path)[0] + ".lock.json"
+        for name, argv, is_batch in scenarios(repo_dir, config_path, commit, rpc_url):
+            if args.scenario and name not in args.scenario:
+                continue
+            shutil.rmtree(cache_root, ignore_errors=True)
+            if os.path.exists(lockfile):
+                os.remove(lockfile)
+            run_generator(argv, env, root, trace_path)
+            samples = []
+            for _ in range(args.repeat):
+                wall, first_work, totals, stdout = run_generator(argv, env, root, trace_path)
+                samples.append((wall, first_work, totals))
+                if is_batch:
+                    batch_outputs.add(stdout)
+            report["scenarios"][name] = summarize(samples)
+            print(f"{name:>22}: {report['scenarios'][name]['wall_ms']['median']:10.1f} ms, first work after "
+                  f"{report['scenarios'][name]['first_work_ms']['median']:6.1f} ms (median of {args.repeat})", file=sys.stderr)
+        if len(batch_outputs) > 1:
+            sys.exit("Batch scenarios rendered different output.")
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+        for name, result in report["scenarios"].items():
+            if name in baseline:
+                ratio = baseline[name]["wall_ms"]["median"] / result["wall_ms"]["median"]
+                line = f"{name:>22}: {ratio:.2f}x vs {args.compare}"
+                if "first_work_ms" in baseline[name]:
+                    line += f", first work {baseline[name]['first_work_ms']['median'] / result['first_work_ms']['median']:.2f}x"
+                print(line, file=sys.stderr)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
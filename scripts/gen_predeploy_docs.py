@@ -4,9 +4,25 @@ import sys
 import os
 import re
 import json
+import shlex
+import shutil
+import hashlib
+import time
+import contextlib
+import threading
+import atexit
+import mmap
+import itertools
+import importlib.util
+
+# Modules only some subcommands need (asyncio, http.client, ctypes, concurrent.futures, ...) and jinja2 are
+# imported where they are used, which keeps the startup of every invocation short.
 
 SOURCE_HASH_PREFIX = "0x0000000000000000000000000000000000000000000000000000000000000002"
 
+DEFAULT_CACHE_ROOT = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "op-specs")
+DEFAULT_GAS_CACHE_PATH = os.path.join(DEFAULT_CACHE_ROOT, "gas-estimates.json")
+
 JINJA_TEMPLATE = """### {{ params.contract_name }} Deployment
 <!-- Generated with: {{ params.command }} -->
 
@@ -110,111 +126,231 @@ def format_args_with_alternate_newlines(args):
             result.append(' ')
     return ''.join(result)
 
-def check_dependencies():
-    """Check if required commands and packages are available."""
-    commands = ['git', 'make', 'jq', 'cast']
-    for cmd in commands:
-        try:
-            result = run_cmd([cmd, '--version'], check=False)
-            if not result:
-                raise EnvironmentError(f"Required command '{cmd}' not found or not working in shell environment. Ensure it is installed and available in PATH via your shell (considering tools like mise).")
-        except Exception as e:
-            raise EnvironmentError(f"Required command '{cmd}' not found in PATH or failed to execute: {str(e)}.")
+# Command execution. Tools are resolved to absolute paths once per session, searching the mise shim
+# directories ahead of PATH, and executed directly with argv lists and one shared environment, so no
+# shell is started per command. Resolved paths and their `--version` probes are cached across runs in
+# DEFAULT_TOOL_CACHE_PATH and revalidated with a stat() of the resolved file.
+
+DEFAULT_TOOL_CACHE_PATH = os.path.join(DEFAULT_CACHE_ROOT, "tools.json")
+
+_tool_lock = threading.RLock()
+_tools = {}
+_reprobed_tools = set()
+_command_env = {}
+
+def command_env():
+    """Returns the environment commands run with: the process environment with the mise shim directories prepended to PATH."""
+    with _tool_lock:
+        if not _command_env:
+            custom_env = os.environ.copy()
+            home_dir = os.environ.get('HOME', '')
+            if home_dir:
+                mise_paths = [
+                    f"{home_dir}/.local/bin",
+                    f"{home_dir}/.local/share/mise/shims"
+                ]
+                current_path = custom_env.get('PATH', '')
+                custom_env['PATH'] = ':'.join(mise_paths + [current_path])
+            _command_env.update(custom_env)
+        return _command_env
+
+def _tool_fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _load_tool_cache():
+    """Loads the tools cached by a previous run with the same PATH, dropping any whose file changed."""
     try:
-        import jinja2
-    except ImportError:
-        raise EnvironmentError("Required Python package 'jinja2' is not installed. Please install it with 'uv pip install jinja2'.")
+        with open(DEFAULT_TOOL_CACHE_PATH) as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return
+    if cache.get("path_env") != command_env()["PATH"]:
+        return
+    for name, tool in cache.get("tools", {}).items():
+        try:
+            if _tool_fingerprint(tool["path"]) == tool["fingerprint"]:
+                _tools[name] = tool
+        except (OSError, KeyError, TypeError):
+            continue
 
-def stash_and_checkout(repo_path, git_commit_hash):
-    """Stash any changes in the repo and checkout the specified commit. Returns True if successful, False otherwise."""
+def _save_tool_cache():
     try:
-        result = subprocess.run(['git', 'status', '--porcelain'], cwd=repo_path, capture_output=True, text=True, check=True)
-        if result.stdout.strip():
-            subprocess.run(['git', 'stash', 'push', '-m', 'Temporary stash for TOML generation'], 
-                           cwd=repo_path, check=True, capture_output=True, text=True)
-            success(f"Changes in Optimism repo stashed successfully.")
-        subprocess.run(['git', 'checkout', git_commit_hash], 
-                       cwd=repo_path, check=True, capture_output=True, text=True)
-        success(f"Checked out commit {git_commit_hash} in Optimism repo.")
-        return True
-    except subprocess.CalledProcessError as e:
-        error(f"Error during git operations: {e.stderr}")
-        return False
+        os.makedirs(os.path.dirname(DEFAULT_TOOL_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{DEFAULT_TOOL_CACHE_PATH}.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump({"path_env": command_env()["PATH"], "tools": _tools}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, DEFAULT_TOOL_CACHE_PATH)
+    except OSError:
+        pass
+
+def resolve_tool(name, probe_version=False, reprobe=False):
+    """
+    Returns the registry entry {"path", "fingerprint", "version"} of a tool, resolving it on first use.
+    With probe_version, also runs `<tool> --version` unless a cached probe of the same file exists. With
+    reprobe, the cached probe is not trusted and `--version` runs once per process, for versions that key a
+    cache: a mise shim stays the same file when the version it runs changes.
+    Raises EnvironmentError if the tool cannot be found or does not run.
+    """
+    env_path = command_env()["PATH"]
+    with _tool_lock:
+        if not _tools:
+            _load_tool_cache()
+        tool = _tools.get(name)
+        if tool is None:
+            path = shutil.which(name, path=env_path)
+            if path is None:
+                raise EnvironmentError(f"Required command '{name}' not found in PATH (including the mise shims). Ensure it is installed and available in PATH (considering tools like mise).")
+            tool = {"path": os.path.abspath(path), "fingerprint": _tool_fingerprint(path), "version": None}
+            _tools[name] = tool
+            _save_tool_cache()
+        if probe_version and (not tool["version"] or (reprobe and name not in _reprobed_tools)):
+            result = subprocess.run([tool["path"], "--version"], capture_output=True, text=True, env=command_env())
+            version = result.stdout.strip().splitlines()[0] if result.returncode == 0 and result.stdout.strip() else ""
+            if not version:
+                raise EnvironmentError(f"Required command '{name}' at {tool['path']} failed to run `{name} --version`.")
+            tool["version"] = version
+            _reprobed_tools.add(name)
+            _save_tool_cache()
+        return tool
+
+def tool_argv(command):
+    """Returns command (an argv list or a plain command string) with the executable resolved to its absolute path."""
+    argv = shlex.split(command) if isinstance(command, str) else list(command)
+    if os.sep not in argv[0]:
+        argv[0] = resolve_tool(argv[0])["path"]
+    return argv
 
-def restore_repo_state(repo_path):
-    """Restore the repository to its original state."""
-    try:
-        result = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], 
-                                cwd=repo_path, capture_output=True, text=True, check=True)
-        current_ref = result.stdout.strip()
-        if current_ref == 'HEAD':
-            current_ref = subprocess.run(['git', 'rev-parse', 'HEAD'], 
-                                         cwd=repo_path, capture_output=True, text=True, check=True).stdout.strip()
-        subprocess.run(['git', 'checkout', current_ref], 
-                       cwd=repo_path, check=True, capture_output=True, text=True)
-        success(f"Checked out original ref {current_ref} in Optimism repo.")
-        stash_result = subprocess.run(['git', 'stash', 'list'], cwd=repo_path, capture_output=True, text=True, check=True)
-        if stash_result.stdout.strip() and 'Temporary stash for TOML generation' in stash_result.stdout:
-            subprocess.run(['git', 'stash', 'pop'], 
-                           cwd=repo_path, check=True, capture_output=True, text=True)
-            success(f"Stashed changes in Optimism repo restored successfully.")
-    except subprocess.CalledProcessError as e:
-        error(f"Error restoring repo state: {e.stderr}")
+def check_dependencies():
+    """Check if required commands and packages are available."""
+    commands = ['git', 'make', 'cast']
+    for cmd in commands:
+        resolve_tool(cmd, probe_version=True)
+    # Only look jinja2 up here, it is imported when the first template is compiled
+    if importlib.util.find_spec("jinja2") is None:
+        raise EnvironmentError("Required Python package 'jinja2' is not installed. Please install it with 'uv pip install jinja2'.")
 
 def run_cmd(command, check=True, capture_output=True, text=True, cwd=None, env=None):
-    """Runs a shell command and returns its output. Uses the user's shell to ensure environment hooks are applied."""
+    """Runs a command (an argv list, or a string split like a shell would) directly, without a shell, and returns its output."""
     # Only log commands if there's an error
+    cmd_str = command if isinstance(command, str) else shlex.join(command)
     try:
-        shell_cmd = os.environ.get('SHELL', '/bin/sh')
-        if isinstance(command, list):
-            cmd_str = ' '.join(command)
-        else:
-            cmd_str = command
-        full_cmd = [shell_cmd, '-c', cmd_str]
-        custom_env = env or os.environ.copy()
-        home_dir = os.environ.get('HOME', '')
-        if home_dir:
-            mise_paths = [
-                f"{home_dir}/.local/bin",
-                f"{home_dir}/.local/share/mise/shims"
-            ]
-            current_path = custom_env.get('PATH', '')
-            custom_env['PATH'] = ':'.join(mise_paths + [current_path])
-        result = subprocess.run(
-            full_cmd,
-            check=check,
-            capture_output=capture_output,
-            text=text,
-            cwd=cwd,
-            env=custom_env
-        )
+        argv = tool_argv(command)
+        with trace_phase(os.path.basename(argv[0]), category="cmd", command=cmd_str[:200]):
+            result = subprocess.run(
+                argv,
+                check=check,
+                capture_output=capture_output,
+                text=text,
+                cwd=cwd,
+                env=dict(command_env(), **env) if env else command_env()
+            )
         return result.stdout.strip() if result.stdout else ""
     except subprocess.CalledProcessError as e:
-        error(f"Error running command: {' '.join(command) if isinstance(command, list) else command}")
+        error(f"Error running command: {cmd_str}")
         error(f"Return code: {e.returncode}")
         error(f"Output:\n{e.stdout}")
         error(f"Error:\n{e.stderr}")
         sys.exit(1)
-    except FileNotFoundError:
-        error(f"Error: Shell not found: {shell_cmd}. Please ensure SHELL environment variable is set correctly.")
+    except (EnvironmentError, FileNotFoundError) as e:
+        error(f"Error running command: {cmd_str}: {e}")
         sys.exit(1)
 
+# Phase tracing. With --trace, each phase of a run (checkout, build, cache, extract, hash, estimate, render,
+# restore) and every external command is recorded as a Chrome trace "complete" event, which can be opened in
+# chrome://tracing or https://ui.perfetto.dev. Log lines are then prefixed with the time since startup.
+
+TRACE_START = time.perf_counter()
+_trace_lock = threading.Lock()
+_trace_events = None
+
+def log_prefix():
+    """Returns the elapsed time prefix of log lines, which is only added while tracing."""
+    return f"[+{time.perf_counter() - TRACE_START:8.3f}s] " if _trace_events is not None else ""
+
+@contextlib.contextmanager
+def trace_phase(name, category="phase", **details):
+    """Records the time spent in the body as a trace event, if tracing is enabled."""
+    if _trace_events is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - TRACE_START) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": details,
+        }
+        with _trace_lock:
+            _trace_events.append(event)
+
+def trace_totals(events):
+    """Sums the trace events by category and name, e.g. {"phase:build": {"count": 1, "total_ms": ..., "max_ms": ...}}."""
+    totals = {}
+    for event in events:
+        total = totals.setdefault(f"{event['cat']}:{event['name']}", {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        total["count"] += 1
+        total["total_ms"] += event["dur"] / 1000
+        total["max_ms"] = max(total["max_ms"], event["dur"] / 1000)
+    for total in totals.values():
+        total["total_ms"] = round(total["total_ms"], 3)
+        total["max_ms"] = round(total["max_ms"], 3)
+    return dict(sorted(totals.items()))
+
+def start_tracing(trace_path):
+    """
+    Enables tracing if trace_path is set. On exit, the whole run is recorded as a "run" event and every
+    event is written to trace_path in the Chrome trace format, with per-phase totals under "phaseTotals".
+    """
+    global _trace_events
+    if not trace_path:
+        return
+    _trace_events = []
+    start = time.perf_counter()
+
+    def write_trace():
+        end = time.perf_counter()
+        with _trace_lock:
+            events = sorted(_trace_events + [{
+                "name": "run", "cat": "phase", "ph": "X",
+                "ts": round((start - TRACE_START) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": {"argv": sys.argv[1:]},
+            }], key=lambda event: event["ts"])
+        with open(trace_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "phaseTotals": trace_totals(events)}, f, indent=2)
+            f.write("\n")
+        info(f"Wrote trace with {len(events)} events to {trace_path}")
+
+    atexit.register(write_trace)
+
+def add_trace_args(parser):
+    """Adds the tracing options to an argument parser."""
+    parser.add_argument("--trace", type=str, default="", help="Write a Chrome trace (JSON) of the time spent in each phase and external command to this path.")
+
 # Helper functions for colored logging
 def info(msg):
     """Print informational messages in blue."""
-    print(f"\033[34m{msg}\033[0m", file=sys.stderr)
+    print(f"\033[34m{log_prefix()}{msg}\033[0m", file=sys.stderr)
 
 def success(msg):
     """Print success messages in green."""
-    print(f"\033[32m{msg}\033[0m", file=sys.stderr)
+    print(f"\033[32m{log_prefix()}{msg}\033[0m", file=sys.stderr)
 
 def warning(msg):
     """Print warning messages in yellow."""
-    print(f"\033[33m{msg}\033[0m", file=sys.stderr)
+    print(f"\033[33m{log_prefix()}{msg}\033[0m", file=sys.stderr)
 
 def error(msg):
     """Print error messages in red to stderr."""
-    print(f"\033[31m{msg}\033[0m", file=sys.stderr)
+    print(f"\033[31m{log_prefix()}{msg}\033[0m", file=sys.stderr)
 
 def parse_constructor_signature(abi_json):
     """
@@ -227,125 +363,931 @@ def parse_constructor_signature(abi_json):
             return f"constructor({','.join(types)})"
     return None
 
-def extract_constructor_signature(contract_name, cwd=None):
-    """
-    Runs `forge inspect <contract_name> abi`, parses the JSON,
-    and returns the constructor signature string (or None if not found).
-    """
-    # invoke forge
-    result = run_cmd(
-        ["forge", "inspect", contract_name, "abi", "--json"],
-        cwd=cwd
-    )
-
-    try:
-        abi = json.loads(result)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse ABI JSON: {e}")
-    sig = parse_constructor_signature(abi)
-    return sig
-
-def get_git_status(cwd=None):
-    """Gets the current git branch or commit SHA in the specified directory."""
-    try:
-        # Check if HEAD is detached
-        sha = run_cmd(["git", "rev-parse", "HEAD"], check=False, cwd=cwd)
-        # Try to get branch name
-        branch = run_cmd(["git", "symbolic-ref", "--short", "-q", "HEAD"], check=False, cwd=cwd)
-        if branch:
-            return branch
-        # If no branch, return the SHA (detached head)
-        return sha
-    except Exception as e:
-        print(f"Warning: Could not determine git status in {cwd}: {e}", file=sys.stderr)
-        return None
-
-def git_checkout(commit_hash, repo_dir):
-    """Checks out the specified git commit in the repository."""
-    info(f"Checking out git commit: {commit_hash}...")
-    return run_cmd(["git", "checkout", commit_hash], cwd=repo_dir)
-
 def build_contracts(repo_dir):
     """Builds contracts using 'make build-contracts' in the repository."""
     info(f"Building contracts with 'make build-contracts'...")
-    return run_cmd("make build-contracts", cwd=repo_dir)
+    with trace_phase("build", repo_dir=repo_dir):
+        return run_cmd("make build-contracts", cwd=repo_dir)
+
+# Forge artifact loader. Artifacts of large contracts are multi-megabyte because of the AST and
+# sourcemaps, but only the leading `abi`, `bytecode` and `deployedBytecode` fields are needed. The file
+# is memory-mapped and only those values are decoded, in one pass, falling back to a full parse if the
+# layout is unexpected. Results are memoized for the run.
+
+ARTIFACT_FIELDS = ("abi", "bytecode", "deployedBytecode")
+ARTIFACT_FIELD_PATTERN = re.compile(rb'(?<!\\)"(abi|bytecode|deployedBytecode)"\s*:\s*')
+
+_artifact_lock = threading.Lock()
+_artifacts = {}
+
+def _decode_json_value(mapped, offset):
+    """Decodes the JSON value starting at offset, reading a growing window until the value is complete."""
+    decoder = json.JSONDecoder()
+    window = 1 << 16
+    while True:
+        chunk = mapped[offset:offset + window].decode()
+        try:
+            return decoder.raw_decode(chunk)[0]
+        except json.JSONDecodeError:
+            if offset + window >= len(mapped):
+                raise
+            window *= 4
+
+def _parse_artifact(path):
+    """Returns the abi, creation bytecode and deployed bytecode of the forge artifact at path."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        fields = {}
+        try:
+            for match in ARTIFACT_FIELD_PATTERN.finditer(mapped):
+                name = match.group(1).decode()
+                if name not in fields:
+                    fields[name] = _decode_json_value(mapped, match.end())
+                    if len(fields) == len(ARTIFACT_FIELDS):
+                        break
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            fields = {}
+        if len(fields) != len(ARTIFACT_FIELDS) or not isinstance(fields["abi"], list):
+            fields = json.loads(mapped[:])
+    return {
+        "abi": fields["abi"],
+        "bytecode": fields["bytecode"]["object"],
+        "deployed_bytecode": fields["deployedBytecode"]["object"],
+    }
+
+def load_artifact(forge_artifact_path, artifacts_dir):
+    """Loads a forge artifact relative to artifacts_dir, parsing each file at most once per run."""
+    absolute_path = os.path.abspath(os.path.join(artifacts_dir, forge_artifact_path))
+    with _artifact_lock:
+        if absolute_path in _artifacts:
+            return _artifacts[absolute_path]
+    if not os.path.exists(absolute_path):
+        error(f"Error: Forge artifact file not found after build: {absolute_path}")
+        sys.exit(1)
+    try:
+        with trace_phase("extract", path=forge_artifact_path):
+            artifact = _parse_artifact(absolute_path)
+    except (KeyError, TypeError, ValueError) as e:
+        error(f"Error: Failed to read bytecode and ABI from forge artifact {absolute_path}: {e}")
+        sys.exit(1)
+    with _artifact_lock:
+        _artifacts[absolute_path] = artifact
+    return artifact
 
-def extract_bytecode(jq_cmd, repo_dir):
-    """Extracts bytecode using jq command in the repository."""
-    info(f"Extracting deployed bytecode...")
-    return run_cmd(jq_cmd, cwd=repo_dir)
+def reload_artifact(forge_artifact_path, artifacts_dir):
+    """
+    Parses a forge artifact again and replaces its memoized entry, for artifacts rebuilt during the run.
+    Unlike load_artifact(), failures raise (OSError, KeyError, TypeError or ValueError) instead of exiting.
+    """
+    absolute_path = os.path.abspath(os.path.join(artifacts_dir, forge_artifact_path))
+    artifact = _parse_artifact(absolute_path)
+    with _artifact_lock:
+        _artifacts[absolute_path] = artifact
+    return artifact
+
+# Native keccak256 and encoding helpers. These replace `cast k`, `cast keccak`, `cast concat-hex`,
+# `cast compute-address`, `cast sig` and `cast abi-encode`, so no shell or `cast` process is spawned
+# and full bytecode never has to be passed through argv.
+
+KECCAK_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+KECCAK_ROTATIONS = [
+    0, 1, 62, 28, 27,
+    36, 44, 6, 55, 20,
+    3, 10, 43, 25, 39,
+    41, 45, 15, 21, 8,
+    18, 2, 61, 56, 14,
+]
+KECCAK_RATE = 136
+MASK_64 = (1 << 64) - 1
+
+def _keccak_f1600(lanes):
+    """Applies the Keccak-f[1600] permutation in place. Lanes are indexed as x + 5 * y."""
+    for round_constant in KECCAK_ROUND_CONSTANTS:
+        c = [lanes[x] ^ lanes[x + 5] ^ lanes[x + 10] ^ lanes[x + 15] ^ lanes[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ (((c[(x + 1) % 5] << 1) | (c[(x + 1) % 5] >> 63)) & MASK_64) for x in range(5)]
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                index = x + 5 * y
+                lane = lanes[index] ^ d[x]
+                rotation = KECCAK_ROTATIONS[index]
+                if rotation:
+                    lane = ((lane << rotation) | (lane >> (64 - rotation))) & MASK_64
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = lane
+        for y in range(0, 25, 5):
+            row = b[y:y + 5]
+            for x in range(5):
+                lanes[y + x] = row[x] ^ (~row[(x + 1) % 5] & row[(x + 2) % 5])
+        lanes[0] ^= round_constant
+
+def _keccak256_pure(data):
+    """Pure Python keccak256, used when pycryptodome is not installed."""
+    padded = bytearray(data)
+    padded.append(0x01)
+    padded.extend(b"\x00" * (-len(padded) % KECCAK_RATE))
+    padded[-1] |= 0x80
+    lanes = [0] * 25
+    for offset in range(0, len(padded), KECCAK_RATE):
+        block = padded[offset:offset + KECCAK_RATE]
+        for i in range(KECCAK_RATE // 8):
+            lanes[i] ^= int.from_bytes(block[8 * i:8 * i + 8], "little")
+        _keccak_f1600(lanes)
+    return b"".join(lane.to_bytes(8, "little") for lane in lanes[:4])
+
+def keccak256(data):
+    """Returns the keccak256 digest of data (bytes, or str which is hashed as UTF-8)."""
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        from Crypto.Hash import keccak
+    except ImportError:
+        return _keccak256_pure(data)
+    return keccak.new(data=data, digest_bits=256).digest()
+
+def unprefixed_hex(value):
+    """Returns a hex string without its 0x prefix, if it has one."""
+    return value[2:] if value.startswith("0x") else value
+
+def hex_to_bytes(value):
+    """Decodes a hex string with or without the 0x prefix."""
+    return bytes.fromhex(unprefixed_hex(value))
+
+def to_checksum_address(address_bytes):
+    """Returns the EIP-55 checksummed form of a 20 byte address."""
+    address_hex = address_bytes.hex()
+    address_hash = keccak256(address_hex).hex()
+    return "0x" + "".join(c.upper() if int(address_hash[i], 16) >= 8 else c for i, c in enumerate(address_hex))
+
+def rlp_encode_bytes(value):
+    """RLP-encodes a byte string."""
+    if len(value) == 1 and value[0] < 0x80:
+        return value
+    if len(value) <= 55:
+        return bytes([0x80 + len(value)]) + value
+    length = len(value).to_bytes((len(value).bit_length() + 7) // 8, "big")
+    return bytes([0xb7 + len(length)]) + length + value
+
+def rlp_encode_list(items):
+    """RLP-encodes a list of already encoded items."""
+    payload = b"".join(items)
+    if len(payload) <= 55:
+        return bytes([0xc0 + len(payload)]) + payload
+    length = len(payload).to_bytes((len(payload).bit_length() + 7) // 8, "big")
+    return bytes([0xf7 + len(length)]) + length + payload
+
+def compute_create_address(from_address, nonce):
+    """Computes the CREATE address keccak256(rlp([sender, nonce]))[12:], checksummed like `cast compute-address`."""
+    nonce_bytes = nonce.to_bytes((nonce.bit_length() + 7) // 8, "big")
+    encoded = rlp_encode_list([rlp_encode_bytes(hex_to_bytes(from_address)), rlp_encode_bytes(nonce_bytes)])
+    return to_checksum_address(keccak256(encoded)[12:])
+
+def compute_source_hash(intent):
+    """Computes the "Upgrade-deposited" sourceHash: keccak256(bytes32(2) ++ keccak256(intent))."""
+    return "0x" + keccak256(hex_to_bytes(SOURCE_HASH_PREFIX) + keccak256(intent)).hex()
+
+def encode_upgrade_to_calldata(address):
+    """ABI-encodes an `upgradeTo(address)` call, matching `cast concat-hex $(cast sig ...) $(cast abi-encode ...)`."""
+    selector = keccak256("upgradeTo(address)")[:4]
+    return "0x" + (selector + hex_to_bytes(address).rjust(32, b"\x00")).hex()
 
 def compute_code_hash(bytecode):
-    """Computes code hash using cast."""
-    return run_cmd(["cast", "k", bytecode])
+    """Computes the code hash of hex encoded bytecode."""
+    return "0x" + keccak256(hex_to_bytes(bytecode)).hex()
 
 def compute_deployed_address(from_address, nonce):
-    """Computes deployed address using cast."""
+    """Computes the address the contract is deployed to."""
     info(f"Deriving deployed address...")
-    result = run_cmd(["cast", "compute-address", "--nonce", str(nonce), from_address])
-    result = result.split('\n')[-1]
-    result = result.split(' ')[-1]
+    result = compute_create_address(from_address, nonce)
     info(f"Deployed Address: {result}")
     return result
 
-def compute_keccak(data):
-    """Computes keccak hash using cast."""
-    return run_cmd(["cast", "keccak", f"\"{data}\""])
+def compute_proxy_update_data(proxy_address):
+    """Computes the proxy upgradeTo calldata."""
+    return encode_upgrade_to_calldata(proxy_address)
+
+# Gas estimation backends. Every backend takes the full init code (creation code followed by the
+# ABI-encoded constructor arguments) and returns the estimated gas as an int. Results are kept in a
+# persistent cache keyed by the backend, the chain and the keccak of the init code, so identical bytecode is
+# never estimated twice against the same chain.
+
+# JSON-RPC requests check out a keep-alive connection from a pool per endpoint instead of opening a new
+# connection per call, so a connection opened ahead of time on one thread is reused by the next request
+# on any thread. A connection the server closed while idle is replaced once.
+
+JSON_RPC_BATCH_LIMIT = 100
+
+_rpc_pool_lock = threading.Lock()
+_rpc_idle = {}
+
+@contextlib.contextmanager
+def _rpc_connection(rpc_url, fresh=False):
+    """Checks out an idle connection to rpc_url, or opens a new one, and returns it to the pool unless the body fails."""
+    import http.client
+    import urllib.parse
+    with _rpc_pool_lock:
+        idle = _rpc_idle.setdefault(rpc_url, [])
+        connection = idle.pop() if idle and not fresh else None
+    if connection is None:
+        url = urllib.parse.urlsplit(rpc_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=60)
+    try:
+        yield connection
+    except BaseException:
+        connection.close()
+        raise
+    with _rpc_pool_lock:
+        _rpc_idle[rpc_url].append(connection)
+
+def warm_rpc_connection(rpc_url):
+    """Opens a pooled connection to rpc_url ahead of the first request. Returns False if it cannot be opened."""
+    import urllib.parse
+    try:
+        with _rpc_connection(rpc_url) as connection:
+            if connection.sock is None:
+                with trace_phase("connect", url=urllib.parse.urlsplit(rpc_url).hostname):
+                    connection.connect()
+    except OSError as e:
+        warning(f"Warning: Could not connect to {rpc_url} ahead of time: {e}")
+        return False
+    return True
+
+def _rpc_post(rpc_url, payload):
+    """POSTs a JSON-RPC payload to rpc_url over the pooled connection and returns the decoded response."""
+    import http.client
+    import urllib.parse
+    url = urllib.parse.urlsplit(rpc_url)
+    path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+    body = json.dumps(payload).encode()
+    for attempt in range(2):
+        try:
+            with _rpc_connection(rpc_url, fresh=attempt > 0) as connection:
+                connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                content = response.read()
+        except (ConnectionError, http.client.HTTPException) as e:
+            if attempt:
+                raise e if isinstance(e, OSError) else OSError(f"JSON-RPC request to {rpc_url} failed: {e}")
+            continue
+        if response.status != 200:
+            raise OSError(f"JSON-RPC request to {rpc_url} failed with HTTP {response.status}: {content[:200]!r}")
+        return json.loads(content)
+
+def json_rpc_call(rpc_url, method, params):
+    """Sends a single JSON-RPC request and returns its result."""
+    body = _rpc_post(rpc_url, {"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+    if "error" in body:
+        raise RuntimeError(f"{method} failed: {body['error']}")
+    return body["result"]
+
+def json_rpc_batch(rpc_url, calls):
+    """Sends [(method, params), ...] as JSON-RPC batches of up to JSON_RPC_BATCH_LIMIT calls and returns the results in order."""
+    results = []
+    for start in range(0, len(calls), JSON_RPC_BATCH_LIMIT):
+        chunk = calls[start:start + JSON_RPC_BATCH_LIMIT]
+        body = _rpc_post(rpc_url, [{"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+                                   for i, (method, params) in enumerate(chunk)])
+        if not isinstance(body, list):
+            raise RuntimeError(f"JSON-RPC batch failed: {body.get('error', body)}")
+        responses = {response.get("id"): response for response in body}
+        for i, (method, _) in enumerate(chunk):
+            response = responses.get(i)
+            if response is None or "error" in response:
+                raise RuntimeError(f"{method} failed: {response['error'] if response else 'no response in batch'}")
+            results.append(response["result"])
+    return results
+
+def estimate_gas_rpc(rpc_url, init_code):
+    """Estimates creation gas with eth_estimateGas against rpc_url."""
+    return int(json_rpc_call(rpc_url, "eth_estimateGas", [{"data": init_code}]), 16)
+
+ANVIL_CHAIN_ID = 31337
+
+_anvil_lock = threading.Lock()
+_anvil_node = {}
+
+def start_anvil():
+    """Starts a local anvil node shared by every estimate of the run and returns its RPC URL."""
+    import socket
+    with _anvil_lock:
+        if "url" in _anvil_node:
+            return _anvil_node["url"]
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        info(f"Starting anvil on port {port}...")
+        process = subprocess.Popen(tool_argv(["anvil", "--port", str(port), "--chain-id", str(ANVIL_CHAIN_ID), "--silent"]),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=command_env())
+        atexit.register(process.terminate)
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                json_rpc_call(url, "eth_chainId", [])
+                break
+            except OSError:
+                if process.poll() is not None:
+                    raise EnvironmentError("anvil exited before it started serving requests.")
+                time.sleep(0.1)
+        else:
+            raise EnvironmentError(f"anvil did not start serving requests on {url}.")
+        _anvil_node["url"] = url
+        return url
+
+def estimate_gas_anvil(init_code):
+    """Estimates creation gas against a local anvil node, without any network access."""
+    return estimate_gas_rpc(start_anvil(), init_code)
+
+EVM_BACKEND_MISSING = "The 'evm' gas backend requires eth-tester. Please install it with 'uv pip install \"eth-tester[py-evm]\"'."
+
+_evm_lock = threading.Lock()
+_evm_tester = {}
+
+def estimate_gas_evm(init_code):
+    """Measures creation gas by executing the init code in an embedded py-evm chain (via eth-tester)."""
+    with _evm_lock:
+        if "tester" not in _evm_tester:
+            try:
+                from eth_tester import EthereumTester, PyEVMBackend
+            except ImportError:
+                raise EnvironmentError(EVM_BACKEND_MISSING)
+            _evm_tester["tester"] = EthereumTester(PyEVMBackend())
+        tester = _evm_tester["tester"]
+        return tester.estimate_gas({"from": tester.get_accounts()[0], "data": init_code})
+
+GAS_BACKENDS = ["rpc", "anvil", "evm"]
+
+_gas_cache_lock = threading.Lock()
+_gas_caches = {}
+_chain_ids = {}
+
+def gas_cache_scope(gas_settings):
+    """
+    Returns the prefix of gas cache keys for gas_settings: the backend and, for rpc and anvil, the chain
+    id, plus the anvil or py-evm version for the local backends, so estimates are never shared between
+    backends, networks or gas schedules.
+    """
+    backend = gas_settings["backend"]
+    if backend == "rpc":
+        rpc_url = gas_settings["rpc_url"]
+        if rpc_url not in _chain_ids:
+            _chain_ids[rpc_url] = int(json_rpc_call(rpc_url, "eth_chainId", []), 16)
+        return f"rpc:{_chain_ids[rpc_url]}"
+    if backend == "anvil":
+        # anvil runs with a fixed chain id, and its version decides the hardfork and so the gas schedule
+        return f"anvil:{ANVIL_CHAIN_ID}:{resolve_tool('anvil', probe_version=True, reprobe=True)['version']}"
+    if backend == "evm":
+        # Likewise, the py-evm release decides the fork eth-tester runs
+        import importlib.metadata
+        try:
+            return f"evm:py-evm{importlib.metadata.version('py-evm')}:eth-tester{importlib.metadata.version('eth-tester')}"
+        except importlib.metadata.PackageNotFoundError:
+            raise EnvironmentError(EVM_BACKEND_MISSING)
+    return backend
+
+def load_gas_cache(cache_path):
+    """Returns the in-memory view of the gas estimate cache at cache_path, loading it on first use."""
+    if cache_path not in _gas_caches:
+        try:
+            with open(cache_path) as f:
+                _gas_caches[cache_path] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            _gas_caches[cache_path] = {}
+    return _gas_caches[cache_path]
+
+def save_gas_estimate(cache_path, key, gas, backend):
+    """Records a gas estimate and atomically rewrites the cache file."""
+    with _gas_cache_lock:
+        cache = load_gas_cache(cache_path)
+        cache[key] = {"gas": gas, "backend": backend}
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_path)
+
+def encode_constructor_args(constructor_signature, constructor_args):
+    """ABI-encodes the comma-separated constructor arguments with `cast abi-encode` (offline), as hex without 0x."""
+    if not constructor_signature or not constructor_args:
+        return ""
+    encoded = run_cmd(["cast", "abi-encode", constructor_signature] + constructor_args.split(','))
+    return encoded[2:] if encoded.startswith("0x") else encoded
+
+def estimate_gas(gas_settings, creation_code, constructor_signature, constructor_args=None):
+    """
+    Estimates gas for deployment with the backend selected in gas_settings ("rpc", "anvil" or "evm"),
+    reusing a cached estimate for identical init code from the same backend and chain when one exists.
+    """
+    info(f"Estimating gas for deployment...")
+    with trace_phase("estimate", backend=gas_settings["backend"]):
+        init_code = creation_code + encode_constructor_args(constructor_signature, constructor_args)
+        cache_path = gas_settings.get("cache_path")
+        backend = gas_settings["backend"]
+        try:
+            if cache_path:
+                key = f"{gas_cache_scope(gas_settings)}:0x{keccak256(hex_to_bytes(init_code)).hex()}"
+                with _gas_cache_lock:
+                    cached = load_gas_cache(cache_path).get(key)
+                if cached:
+                    success(f"Estimated Gas: {cached['gas']} (cached)")
+                    return str(cached["gas"])
+            if backend == "rpc":
+                gas = estimate_gas_rpc(gas_settings["rpc_url"], init_code)
+            elif backend == "anvil":
+                gas = estimate_gas_anvil(init_code)
+            elif backend == "evm":
+                gas = estimate_gas_evm(init_code)
+            else:
+                raise ValueError(f"Unknown gas estimation backend: {backend}")
+        except (OSError, RuntimeError, ValueError) as e:
+            error(f"Error estimating gas with the {backend} backend: {e}")
+            sys.exit(1)
+        if cache_path:
+            save_gas_estimate(cache_path, key, gas, backend)
+        success(f"Estimated Gas: {gas}")
+        return str(gas)
+
+def add_gas_estimation_args(parser):
+    """Adds the gas estimation options to an argument parser."""
+    parser.add_argument("--eth-rpc-url", type=str, help="Ethereum JSON-RPC URL for gas estimation, required by the 'rpc' gas backend.")
+    parser.add_argument("--gas-backend", choices=GAS_BACKENDS, default="rpc", help="How creation gas is estimated: 'rpc' (eth_estimateGas against --eth-rpc-url), 'anvil' (a local anvil node) or 'evm' (embedded py-evm).")
+    parser.add_argument("--gas-cache-path", type=str, default=DEFAULT_GAS_CACHE_PATH, help="Persistent cache of gas estimates keyed by init code hash.")
+    parser.add_argument("--no-gas-cache", action="store_true", help="Always estimate gas instead of using the gas estimate cache.")
+
+def gas_estimation_settings(parser, args):
+    """Returns the gas_settings dict for parsed arguments, failing if the rpc backend has no RPC URL."""
+    if args.gas_backend == "rpc" and not args.eth_rpc_url:
+        parser.error("--eth-rpc-url is required with --gas-backend rpc")
+    return {
+        "backend": args.gas_backend,
+        "rpc_url": args.eth_rpc_url,
+        "cache_path": None if args.no_gas_cache else args.gas_cache_path,
+    }
+
+# Deployment preflight. Every upgrade transaction assumes its from address still has the configured nonce
+# and that nothing is deployed at the resulting address yet. Both are checked for all contracts at once,
+# with one JSON-RPC batch of eth_getTransactionCount and eth_getCode calls. Results are cached for the run.
+
+PREFLIGHT_MODES = ("warn", "strict", "off")
+
+_preflight_lock = threading.Lock()
+_preflight_results = {}
+
+def preflight_deployments(rpc_url, deployments):
+    """
+    Checks deployments, a list of (label, from_address, nonce) tuples, against the chain at rpc_url and
+    returns a list of problems: a from address whose nonce differs, or code already at the deployed address.
+    """
+    deployments = [(label, from_address, nonce, compute_create_address(from_address, nonce))
+                   for label, from_address, nonce in deployments]
+    with _preflight_lock:
+        calls = []
+        for _, from_address, _, deployed_address in deployments:
+            for method, address in (("eth_getTransactionCount", from_address), ("eth_getCode", deployed_address)):
+                if (rpc_url, method, address.lower()) not in _preflight_results and (method, [address, "latest"]) not in calls:
+                    calls.append((method, [address, "latest"]))
+        if calls:
+            info(f"Preflight: checking {len(deployments)} deployments with {len(calls)} batched JSON-RPC calls...")
+            with trace_phase("preflight", calls=len(calls)):
+                results = json_rpc_batch(rpc_url, calls)
+            for (method, (address, _)), result in zip(calls, results):
+                _preflight_results[(rpc_url, method, address.lower())] = result
+
+        problems = []
+        for label, from_address, nonce, deployed_address in deployments:
+            chain_nonce = int(_preflight_results[(rpc_url, "eth_getTransactionCount", from_address.lower())], 16)
+            code = _preflight_results[(rpc_url, "eth_getCode", deployed_address.lower())]
+            if chain_nonce != nonce:
+                problems.append(f"{label}: {from_address} has nonce {chain_nonce} on chain, expected {nonce}")
+            if code not in ("0x", "0x0", "", None):
+                problems.append(f"{label}: code is already deployed at {deployed_address}")
+        return problems
+
+def run_preflight(args, deployments):
+    """Runs the preflight for --preflight, warning about problems or, in strict mode, exiting on them."""
+    if args.preflight == "off" or not deployments:
+        return
+    if not args.eth_rpc_url:
+        info("Preflight: skipped, no --eth-rpc-url given.")
+        return
+    try:
+        problems = preflight_deployments(args.eth_rpc_url, deployments)
+    except (OSError, RuntimeError, ValueError) as e:
+        problems = [f"preflight failed: {e}"]
+    for problem in problems:
+        (error if args.preflight == "strict" else warning)(f"Preflight: {problem}")
+    if problems and args.preflight == "strict":
+        sys.exit(1)
+    if not problems:
+        success(f"Preflight: all {len(deployments)} from addresses have their expected nonce and no deployment addresses are in use.")
 
-def compute_concat_hex(prefix, hash_value):
-    """Computes concatenated hex using cast."""
-    return run_cmd(f'cast concat-hex {prefix} {hash_value}')
+def add_preflight_args(parser):
+    """Adds the deployment preflight options to an argument parser."""
+    parser.add_argument("--preflight", choices=PREFLIGHT_MODES, default="warn", help="Check the from address nonces and deployment addresses against --eth-rpc-url before building: 'warn' reports problems, 'strict' fails on them.")
 
-def compute_proxy_update_data(proxy_address):
-    """Computes proxy update data using cast."""
-    return run_cmd(f'cast concat-hex $(cast sig "upgradeTo(address)") $(cast abi-encode "upgradeTo(address)" {proxy_address})')
+def local_submodule_urls(repo_dir):
+    """
+    Returns `-c submodule.<name>.url=<git dir>` options that point every submodule initialized in repo_dir,
+    nested ones included, at its git dir there, so a worktree can clone its submodules without the network.
+    """
+    modules_dir = os.path.join(repo_dir, run_cmd(["git", "rev-parse", "--git-common-dir"], cwd=repo_dir), "modules")
+    options = []
+    for root, dirs, files in os.walk(modules_dir):
+        if "HEAD" in files and "objects" in dirs:
+            # Nested submodules live in a `modules` directory of their parent's git dir, named relative to it
+            name = os.path.relpath(root, modules_dir).split(f"{os.sep}modules{os.sep}")[-1].replace(os.sep, "/")
+            options += ["-c", f"submodule.{name}.url={os.path.abspath(root)}"]
+            dirs[:] = ["modules"] if "modules" in dirs else []
+    return options
+
+def create_worktree(repo_dir, worktree_dir, commit_hash):
+    """
+    Creates a detached git worktree of repo_dir at commit_hash, with its submodules checked out. Submodules
+    are cloned from the ones already in repo_dir, and only from their remotes if those lack a needed commit.
+    """
+    info(f"Creating worktree for {commit_hash} at {worktree_dir}...")
+    with trace_phase("checkout", commit=commit_hash):
+        run_cmd(["git", "worktree", "add", "--detach", worktree_dir, commit_hash], cwd=repo_dir)
+        local_urls = local_submodule_urls(repo_dir)
+        if local_urls:
+            result = subprocess.run(tool_argv(["git", "-c", "protocol.file.allow=always"] + local_urls + ["submodule", "update", "--init", "--recursive"]),
+                                    cwd=worktree_dir, capture_output=True, text=True, env=command_env())
+            if result.returncode == 0:
+                return
+            info(f"Submodules at {commit_hash} are missing commits in {repo_dir}, cloning them from their remotes instead...")
+            # Start over, since the submodules already cloned locally would keep fetching from repo_dir
+            shutil.rmtree(worktree_dir, ignore_errors=True)
+            run_cmd(["git", "worktree", "prune"], cwd=repo_dir)
+            run_cmd(["git", "worktree", "add", "--detach", worktree_dir, commit_hash], cwd=repo_dir)
+        run_cmd(["git", "submodule", "update", "--init", "--recursive"], cwd=worktree_dir)
+
+def remove_worktree(repo_dir, worktree_dir):
+    """Removes a worktree created by create_worktree. Failures are only logged."""
+    with trace_phase("restore", worktree_dir=worktree_dir):
+        result = subprocess.run(tool_argv(['git', 'worktree', 'remove', '--force', worktree_dir]), cwd=repo_dir, capture_output=True, text=True, env=command_env())
+        if result.returncode != 0:
+            warning(f"Warning: Failed to remove worktree {worktree_dir}: {result.stderr.strip()}")
+            shutil.rmtree(worktree_dir, ignore_errors=True)
+            subprocess.run(tool_argv(['git', 'worktree', 'prune']), cwd=repo_dir, capture_output=True, text=True, env=command_env())
+
+# Selective builds. Instead of `make build-contracts`, which compiles all of contracts-bedrock including
+# tests and scripts, `forge build <sources>` compiles only the source files of the requested contracts
+# and their imports, with the same foundry.toml profile. Bytecode only depends on a contract's own
+# compilation settings and import closure, so the artifacts are identical as long as every contract was
+# compiled with the settings of the profile. That is checked against the settings solc recorded in each
+# artifact's metadata, and the full build is used if they differ, if they cannot be compared, or if
+# foundry.toml assigns per-file compiler settings.
+
+BUILD_MODES = ("auto", "selective", "full")
+CONTRACTS_BEDROCK_DIR = "packages/contracts-bedrock"
+PER_FILE_COMPILER_SETTINGS = ("compilation_restrictions", "additional_compiler_profiles")
+
+def contract_source_paths(bedrock_dir, contract_names):
+    """Returns the source path of each contract relative to bedrock_dir, or None if one is not exactly one `src/**/<name>.sol`."""
+    matches = {name: [] for name in contract_names}
+    for root, _, names in os.walk(os.path.join(bedrock_dir, "src")):
+        for name in names:
+            if name.endswith(".sol") and name[:-len(".sol")] in matches:
+                matches[name[:-len(".sol")]].append(os.path.relpath(os.path.join(root, name), bedrock_dir))
+    if any(len(paths) != 1 for paths in matches.values()):
+        return None
+    return {name: paths[0] for name, paths in matches.items()}
 
-def estimate_gas(rpc_url, creation_code, constructor_signature, constructor_args=None):
-    """Estimates gas for deployment using cast."""
-    info(f"Estimating gas for deployment...")
-    env = os.environ.copy()
-    env["ETH_RPC_URL"] = rpc_url
-    gas_cmd = [
-        "cast", "estimate",
-        "--create",
-        creation_code,
-    ]
-    if constructor_signature:
-        gas_cmd.append(constructor_signature)
-    if constructor_args:
-        args_list = constructor_args.split(',')
-        gas_cmd.extend(args_list)
-    result = run_cmd(gas_cmd, env=env)
-    result = result.split("\n")[-1]
-    success(f"Estimated Gas: {result}")
-    return result
+def selective_build_sources(worktree_dir, contract_names):
+    """Returns (sources, None) if the contracts can be built selectively, otherwise (None, reason)."""
+    bedrock_dir = os.path.join(worktree_dir, CONTRACTS_BEDROCK_DIR)
+    try:
+        with open(os.path.join(bedrock_dir, "foundry.toml")) as f:
+            foundry_toml = f.read()
+    except OSError:
+        return None, "no foundry.toml"
+    for setting in PER_FILE_COMPILER_SETTINGS:
+        if re.search(rf'\b{setting}\b', foundry_toml):
+            return None, f"foundry.toml sets {setting}"
+    sources = contract_source_paths(bedrock_dir, contract_names)
+    if sources is None:
+        return None, "not every contract maps to a single src/**/<name>.sol"
+    return sources, None
+
+def build_selected_contracts(worktree_dir, contract_names, sources):
+    """Compiles only the given sources with forge. Returns True if every contract's artifact was produced from its source."""
+    bedrock_dir = os.path.join(worktree_dir, CONTRACTS_BEDROCK_DIR)
+    paths = sorted(set(sources.values()))
+    info(f"Building {', '.join(contract_names)} selectively with 'forge build' ({len(paths)} sources and their imports)...")
+    with trace_phase("build", mode="selective", sources=len(paths)):
+        try:
+            result = subprocess.run(tool_argv(["forge", "build"] + paths), cwd=bedrock_dir,
+                                    capture_output=True, text=True, env=command_env())
+        except EnvironmentError as e:
+            warning(f"Warning: Selective build unavailable: {e}")
+            return False
+    if result.returncode != 0:
+        warning(f"Warning: Selective build failed: {result.stderr.strip()[-2000:]}")
+        return False
+    for name in contract_names:
+        path = os.path.join(worktree_dir, forge_artifact_path(name))
+        if not os.path.exists(path):
+            warning(f"Warning: Selective build did not produce {forge_artifact_path(name)}.")
+            return False
+    return True
+
+def profile_compiler_settings(bedrock_dir):
+    """Returns the compiler settings of the active foundry.toml profile in bedrock_dir, as resolved by `forge config`."""
+    result = subprocess.run(tool_argv(["forge", "config", "--json"]), cwd=bedrock_dir,
+                            capture_output=True, text=True, env=command_env())
+    if result.returncode != 0:
+        raise ValueError(f"forge config failed: {result.stderr.strip()[-500:]}")
+    config = json.loads(result.stdout)
+    return {
+        "solc": config.get("solc") or config.get("solc_version"),
+        "optimizer": bool(config.get("optimizer")),
+        "optimizer_runs": config.get("optimizer_runs"),
+        "via_ir": bool(config.get("via_ir")),
+        "evm_version": str(config.get("evm_version", "")).lower(),
+        "bytecode_hash": str(config.get("bytecode_hash", "ipfs")).lower(),
+        "remappings": sorted(remapping.lstrip(":") for remapping in config.get("remappings", [])),
+    }
+
+def artifact_compiler_settings(path):
+    """Returns the compiler settings solc recorded in the metadata of a forge artifact, in the form of profile_compiler_settings()."""
+    with open(path) as f:
+        metadata = json.load(f)["metadata"]
+    settings = metadata["settings"]
+    return {
+        "solc": metadata["compiler"]["version"],
+        "optimizer": bool(settings["optimizer"]["enabled"]),
+        "optimizer_runs": settings["optimizer"]["runs"],
+        "via_ir": bool(settings.get("viaIR", False)),
+        "evm_version": settings["evmVersion"].lower(),
+        "bytecode_hash": settings.get("metadata", {}).get("bytecodeHash", "ipfs").lower(),
+        "remappings": sorted(remapping.lstrip(":") for remapping in settings.get("remappings", [])),
+    }
+
+def compiler_settings_mismatch(worktree_dir, contract_names):
+    """
+    Returns why the selectively built artifacts of contract_names may differ from those of a full build,
+    or None if every one of them was compiled with the compiler settings of the foundry.toml profile.
+    """
+    bedrock_dir = os.path.join(worktree_dir, CONTRACTS_BEDROCK_DIR)
+    try:
+        profile = profile_compiler_settings(bedrock_dir)
+        for name in contract_names:
+            artifact = artifact_compiler_settings(os.path.join(worktree_dir, forge_artifact_path(name)))
+            for setting, expected in profile.items():
+                actual = artifact[setting]
+                # An unpinned solc is picked per source by forge, in the full build just the same
+                if setting == "solc" and (not expected or actual.startswith(f"{expected}+")):
+                    continue
+                if actual != expected:
+                    return f"{name} was compiled with {setting} {actual!r}, the profile sets {expected!r}"
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        return f"the compiler settings of the selective build could not be checked ({e})"
+    return None
 
-def derive_contract_code_hash(commit_hash, forge_artifact_path, repo_dir):
-    """Checks out commit, builds, gets code hash, and restores git state in the specified repo_dir."""
-    original_git_state = get_git_status(cwd=repo_dir)
-    absolute_forge_artifact_path = os.path.join(repo_dir, forge_artifact_path)
+def build_at_commit(commit_hash, repo_dir, worktree_dir, contract_names=(), build_mode="full"):
+    """
+    Builds the contracts at commit_hash in a fresh worktree, leaving the checkout in repo_dir untouched.
+    With build_mode "auto" or "selective", only contract_names are compiled unless foundry.toml sets
+    per-file compiler settings or a contract has no single source; otherwise, if the selective build
+    fails, or if its artifacts were not compiled with the settings of the profile, the full build runs.
+    Returns which build ran, "selective" or "full".
+    """
+    create_worktree(repo_dir, worktree_dir, commit_hash)
+    if build_mode != "full" and contract_names:
+        sources, reason = selective_build_sources(worktree_dir, contract_names)
+        if sources and build_selected_contracts(worktree_dir, contract_names, sources):
+            reason = compiler_settings_mismatch(worktree_dir, contract_names)
+            if not reason:
+                return "selective"
+        if reason:
+            (warning if build_mode == "selective" else info)(f"Using the full build for {commit_hash}: {reason}.")
+    build_contracts(worktree_dir)
+    return "full"
+
+def artifact_code_hash(forge_artifact_path, artifacts_dir):
+    """Returns the code hash of the deployed bytecode in an already built forge artifact."""
+    deployed_bytecode = load_artifact(forge_artifact_path, artifacts_dir)["deployed_bytecode"]
+    with trace_phase("hash", path=forge_artifact_path):
+        code_hash = compute_code_hash(deployed_bytecode)
+    success(f"Derived contract code hash: {code_hash}")
+    return code_hash
+
+# Persistent cache of forge artifacts. Entries are keyed by the resolved commit and the compiler settings
+# at that commit, and mirror the repo layout so forge_artifact_path() resolves relative to the entry
+# directory just like it does relative to the Optimism repo.
+
+ARTIFACT_CACHE_MANIFEST = "manifest.json"
+DEFAULT_ARTIFACT_CACHE_DIR = os.path.join(DEFAULT_CACHE_ROOT, "forge-artifacts")
+DEFAULT_ARTIFACT_CACHE_MAX_MB = 1024
+
+def file_sha256(path):
+    """Returns the hex sha256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def artifact_cache_keys(repo_dir, git_commit_hash):
+    """
+    Returns the cache keys for the artifacts built at git_commit_hash by each kind of build, as
+    {"selective": key, "full": key}, or None if the commit cannot be resolved. The keys cover the full
+    commit SHA, the foundry.toml at that commit and FOUNDRY_PROFILE, none of which requires a checkout.
+    """
     try:
-        git_checkout(commit_hash, repo_dir)
-        build_contracts(repo_dir)
-        if not os.path.exists(absolute_forge_artifact_path):
-            error(f"Error: Forge artifact file not found after build: {absolute_forge_artifact_path}")
-            sys.exit(1)
-        jq_cmd = f"jq -r '.deployedBytecode.object' {forge_artifact_path}"
-        bytecode = extract_bytecode(jq_cmd, repo_dir)
-        if not bytecode or bytecode.startswith("jq: error"):
-            error(f"Error: Failed to extract bytecode using jq. Command: {jq_cmd}")
-            error(f"jq output: {bytecode}")
+        sha = subprocess.run(tool_argv(['git', 'rev-parse', '--verify', f"{git_commit_hash}^{{commit}}"]),
+                             cwd=repo_dir, capture_output=True, text=True, check=True, env=command_env()).stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    foundry_toml = subprocess.run(tool_argv(['git', 'show', f"{sha}:packages/contracts-bedrock/foundry.toml"]),
+                                  cwd=repo_dir, capture_output=True, text=True, env=command_env()).stdout
+    keys = {}
+    # Selective entries stored before their compiler settings were checked against the profile are not reused
+    for build, kind in (("selective", "selective-checked"), ("full", "full")):
+        settings = json.dumps({"commit": sha, "foundry_toml": foundry_toml, "profile": os.environ.get("FOUNDRY_PROFILE", ""), "build": kind}, sort_keys=True)
+        keys[build] = hashlib.sha256(settings.encode()).hexdigest()
+    return keys
+
+def read_cache_manifest(entry_dir):
+    """Returns the manifest of a cache entry, or None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(entry_dir, ARTIFACT_CACHE_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def write_cache_manifest(entry_dir, manifest):
+    """Atomically writes the manifest of a cache entry."""
+    tmp_path = os.path.join(entry_dir, f".{ARTIFACT_CACHE_MANIFEST}.{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(entry_dir, ARTIFACT_CACHE_MANIFEST))
+
+def load_cached_artifacts(cache_dir, key, contract_names, allow_missing=False):
+    """
+    Returns (entry_dir, cached_names): the cache entry directory, or None if there is none, and which of
+    contract_names it holds intact artifacts for, plus with allow_missing those recorded as having none.
+    Every file is checked against the sha256 recorded when it was stored; a corrupted entry is discarded.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    manifest = read_cache_manifest(entry_dir)
+    if manifest is None:
+        return None, []
+    cached_names = []
+    for name in contract_names:
+        path = forge_artifact_path(name)
+        if path in manifest["files"]:
+            absolute_path = os.path.join(entry_dir, path)
+            if not os.path.exists(absolute_path) or file_sha256(absolute_path) != manifest["files"][path]["sha256"]:
+                warning(f"Warning: Artifact cache entry {key} failed its integrity check, discarding it.")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return None, []
+            cached_names.append(name)
+        elif allow_missing and path in manifest.get("missing", []):
+            cached_names.append(name)
+    if cached_names:
+        manifest["last_used"] = time.time()
+        write_cache_manifest(entry_dir, manifest)
+    return entry_dir, cached_names
+
+def store_cached_artifacts(cache_dir, key, repo_dir, contract_names, git_commit_hash, allow_missing=False):
+    """
+    Copies the built artifacts of contract_names from repo_dir into the cache entry for key. With
+    allow_missing, contracts without an artifact are recorded as missing instead of failing.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    os.makedirs(entry_dir, exist_ok=True)
+    manifest = read_cache_manifest(entry_dir) or {"commit": git_commit_hash, "files": {}}
+    for name in contract_names:
+        path = forge_artifact_path(name)
+        source_path = os.path.join(repo_dir, path)
+        if not os.path.exists(source_path):
+            if allow_missing:
+                if path not in manifest.setdefault("missing", []):
+                    manifest["missing"].append(path)
+                continue
+            error(f"Error: Forge artifact file not found after build: {source_path}")
             sys.exit(1)
-        code_hash = compute_code_hash(bytecode)
-        success(f"Derived contract code hash: {code_hash}")
-        return code_hash
-    except Exception as e:
-        error(f"An error occurred during contract code hash derivation: {e}")
-        sys.exit(1)
+        target_path = os.path.join(entry_dir, path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copyfile(source_path, target_path)
+        manifest["files"][path] = {"sha256": file_sha256(target_path), "size": os.path.getsize(target_path)}
+    manifest["last_used"] = time.time()
+    write_cache_manifest(entry_dir, manifest)
+    return entry_dir
+
+def evict_cached_artifacts(cache_dir, max_bytes, keep_keys=()):
+    """Removes the least recently used cache entries, other than keep_keys, until the cache fits in max_bytes."""
+    entries = []
+    for key in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+        manifest = read_cache_manifest(os.path.join(cache_dir, key))
+        if manifest is None:
+            continue
+        size = sum(f["size"] for f in manifest["files"].values())
+        entries.append((manifest.get("last_used", 0), key, size))
+    total = sum(size for _, _, size in entries)
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key in keep_keys:
+            continue
+        info(f"Evicting artifact cache entry {key}...")
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total -= size
+
+@contextlib.contextmanager
+def contract_artifacts(repo_dir, commit_contract_names, cache_dir=None, cache_max_bytes=None, jobs=1, scratch_dir=None, build_mode="full",
+                       allow_missing=False):
+    """
+    Yields a dict mapping each commit in commit_contract_names to the directory that forge_artifact_path()
+    resolves against for the artifacts of its contract names. Contracts found in the cache are not built;
+    for every commit with other contracts, only those are built, in a disposable worktree under scratch_dir,
+    up to `jobs` builds at a time, with build_mode as in build_at_commit(), and stored in one cache entry
+    together with the cached ones. Artifacts of selective and full builds are cached apart, and
+    build_mode "full" only uses artifacts of full builds. With allow_missing, contracts that have no artifact at a commit
+    are skipped instead of failing the build. The worktrees are removed on exit and the checkout in repo_dir
+    is never modified.
+    """
+    import concurrent.futures
+    import tempfile
+    artifacts_dirs = {}
+    pending = []
+    for git_commit_hash, contract_names in commit_contract_names.items():
+        with trace_phase("cache", commit=git_commit_hash):
+            keys = artifact_cache_keys(repo_dir, git_commit_hash) if cache_dir else None
+            cached_dir, cached_names = None, []
+            # A full build's artifacts are the reference, so they serve every build mode
+            for build in (("full",) if build_mode == "full" else ("selective", "full")) if keys else ():
+                entry_dir, names = load_cached_artifacts(cache_dir, keys[build], contract_names, allow_missing)
+                if len(names) > len(cached_names):
+                    cached_dir, cached_names = entry_dir, names
+                if len(cached_names) == len(contract_names):
+                    break
+        if cached_dir and len(cached_names) == len(contract_names):
+            success(f"Using cached artifacts for {git_commit_hash} from {cached_dir}.")
+            artifacts_dirs[git_commit_hash] = cached_dir
+        else:
+            pending.append((git_commit_hash, contract_names, keys, cached_dir, cached_names))
+    if not pending:
+        yield artifacts_dirs
+        return
+
+    validate_repo(repo_dir)
+    build_root = tempfile.mkdtemp(prefix="op-specs-build-", dir=scratch_dir)
+    worktrees = []
+
+    def build(index, git_commit_hash, contract_names, keys, cached_dir, cached_names):
+        build_names = [name for name in contract_names if name not in cached_names]
+        if cached_names:
+            info(f"Using cached artifacts of {len(cached_names)} of {len(contract_names)} contracts for {git_commit_hash}, building the rest.")
+        worktree_dir = os.path.join(build_root, f"{index}-{git_commit_hash}")
+        worktrees.append(worktree_dir)
+        built = build_at_commit(git_commit_hash, repo_dir, worktree_dir, build_names, build_mode)
+        if keys:
+            with trace_phase("cache", commit=git_commit_hash):
+                entry_dir = store_cached_artifacts(cache_dir, keys[built], worktree_dir, build_names, git_commit_hash, allow_missing)
+                if cached_names and cached_dir != entry_dir:
+                    # Copy the cached artifacts over, so one entry holds every artifact of the commit
+                    store_cached_artifacts(cache_dir, keys[built], cached_dir, cached_names, git_commit_hash, allow_missing)
+            success(f"Cached artifacts for {git_commit_hash} in {entry_dir}.")
+            # The cache entry outlives the worktree, so later steps can read from it
+            return entry_dir
+        return worktree_dir
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {build_args[0]: executor.submit(build, index, *build_args) for index, build_args in enumerate(pending)}
+            for git_commit_hash, future in futures.items():
+                artifacts_dirs[git_commit_hash] = future.result()
+        if cache_dir:
+            # Once every build is done, so no entry this run reads from, cache hits included, is evicted
+            in_use = {os.path.basename(path) for path in artifacts_dirs.values()
+                      if os.path.dirname(os.path.abspath(path)) == os.path.abspath(cache_dir)}
+            evict_cached_artifacts(cache_dir, cache_max_bytes, keep_keys=in_use)
+        yield artifacts_dirs
     finally:
-        if original_git_state:
-            info(f"Restoring git state in {repo_dir} to: {original_git_state}...")
-            git_checkout(original_git_state, repo_dir)
+        for worktree_dir in worktrees:
+            remove_worktree(repo_dir, worktree_dir)
+        shutil.rmtree(build_root, ignore_errors=True)
+
+def add_artifact_cache_args(parser):
+    """Adds the artifact cache and build isolation options to an argument parser."""
+    parser.add_argument("--scratch-dir", type=str, default=None, help="Directory for the disposable build worktrees (defaults to the system temp dir).")
+    parser.add_argument("--artifact-cache-dir", type=str, default=DEFAULT_ARTIFACT_CACHE_DIR, help="Directory of the persistent forge artifact cache.")
+    parser.add_argument("--artifact-cache-max-mb", type=int, default=DEFAULT_ARTIFACT_CACHE_MAX_MB, help="Size limit of the artifact cache in MB, least recently used entries are evicted first.")
+    parser.add_argument("--no-artifact-cache", action="store_true", help="Always check out and build instead of using the artifact cache.")
+    parser.add_argument("--build-mode", choices=BUILD_MODES, default="auto", help="'selective' compiles only the needed contracts with 'forge build <sources>', 'full' runs 'make build-contracts', 'auto' builds selectively and falls back to the full build unless the artifacts were compiled with the settings of the foundry.toml profile.")
+
+def artifact_cache_settings(args):
+    """Returns the (cache_dir, cache_max_bytes) pair for parsed arguments, with cache_dir None when disabled."""
+    if args.no_artifact_cache:
+        return None, None
+    return args.artifact_cache_dir, args.artifact_cache_max_mb * 1024 * 1024
 
 def forge_artifact_path(contract_name):
     """Returns the path to the forge artifact for the contract."""
@@ -355,69 +1297,311 @@ def data_path(fork_name, contract_name):
     """Returns the data path for the contract."""
     return f"../specs/static/bytecode/{fork_name.lower()}-{camel_to_kebab(contract_name)}-deployment.txt"
 
-def render_template(data):
-    """Render a Jinja2 template with the provided data."""
-    import jinja2
-    env = jinja2.Environment()
-    template = env.from_string(JINJA_TEMPLATE)
-    return template.render(params=data)
-
-def main():
-    parser = argparse.ArgumentParser(description="Generate TOML config for the predeploy_upgrade Tera macro.")
-    parser.add_argument("--optimism-repo-path", type=str, required=True, help="Path to the Optimism repository directory.")
-    parser.add_argument("--fork-name", type=str, required=True, help="Name of the fork (e.g., Isthmus)")
-    parser.add_argument("--contract-name", type=str, required=True, help="Name of the contract (e.g., CrossL2Inbox)")
-    parser.add_argument("--from-address", type=str, required=True, help="Address deploying the contract")
-    parser.add_argument("--from-address-nonce", type=int, required=True, help="Nonce of the deploying address")
-    parser.add_argument("--git-commit-hash", type=str, required=True, help="Git commit hash to build contracts from.")
-    parser.add_argument("--eth-rpc-url", type=str, required=True, help="Ethereum JSON-RPC URL for gas estimation.")
-    parser.add_argument("--constructor-args", type=str, help="Comma-separated values for constructor arguments (e.g., 'arg1,arg2,arg3')")
-    parser.add_argument("--template-path", type=str, default="specs/macros/predeploy_upgrade.jinja", help="Path to the Jinja template file.")
-    parser.add_argument("--proxy-address", type=str, default="", help="Address of the proxy to update, find in github.com/ethereum-optimism/optimism/op-service/predeploys/addresses.go.")
-    parser.add_argument("--copy-contract-bytecode", type=bool, default=False, help="Whether to copy the contract bytecode to the data path.")
+def inc_hex(hex_value):
+    """Increments a hex address by one, keeping the 0x prefix and the 20 byte width."""
+    return f"0x{int(hex_value, 16) + 1:040x}"
 
-    args = parser.parse_args()
+# Content-addressed bytecode store. Creation bytecode is stored once per distinct contract as raw bytes in
+# specs/static/bytecode/store/<keccak>.bin, and index.json maps each `<fork>-<contract>` key to its hash.
+# The `<fork>-<contract>-deployment.txt` files that the specs link to are a view generated from the
+# index (`gen_predeploy_docs.py bytecode view`) and are not committed.
 
-    try:
-        check_dependencies()
-    except EnvironmentError as e:
-        error(f"Dependency check failed: {e}")
-        sys.exit(1)
+SPECS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "specs")
+BYTECODE_DIR = os.path.join(SPECS_DIR, "static", "bytecode")
+BYTECODE_INDEX = "index.json"
+BYTECODE_STORE = "store"
+BYTECODE_VIEW_PATTERN = re.compile(r'^(.+)-deployment\.txt$')
 
-    if not os.path.isdir(args.optimism_repo_path):
-        error(f"Error: Provided Optimism repo directory does not exist or is not a directory: {args.optimism_repo_path}")
-        sys.exit(1)
-    if not os.path.exists(os.path.join(args.optimism_repo_path, ".git")):
-        warning(f"Warning: Provided directory does not appear to be a git repository: {args.optimism_repo_path}")
+_bytecode_index_lock = threading.Lock()
 
-    if not stash_and_checkout(args.optimism_repo_path, args.git_commit_hash):
-        error(f"Failed to stash changes or checkout commit in Optimism repo. Aborting.")
-        sys.exit(1)
+def bytecode_key(fork_name, contract_name):
+    """Returns the bytecode index key of a contract deployment, e.g. "isthmus-l1-block"."""
+    return f"{fork_name.lower()}-{camel_to_kebab(contract_name)}"
 
-    try:
-        intent = f"{args.fork_name}: {args.contract_name} Deployment"
-        info(f"Deriving parameters for {intent}...")
-        deployed_address = compute_deployed_address(args.from_address, args.from_address_nonce)
-        info(f"Computing source hash...")
-        source_hash = compute_keccak(compute_concat_hex(SOURCE_HASH_PREFIX, compute_keccak(intent)))
-        info(f"Source Hash: {source_hash}")
+def bytecode_view_path(key, bytecode_dir=BYTECODE_DIR):
+    """Returns the path of the generated view file of an index key, which data_path() links point to."""
+    return os.path.join(bytecode_dir, f"{key}-deployment.txt")
 
-        info(f"Deriving Contract Bytecode...")
-        forge_artifact_path_val = forge_artifact_path(args.contract_name)
-        contract_code_hash = derive_contract_code_hash(args.git_commit_hash, forge_artifact_path_val, args.optimism_repo_path)
-        jq_creation_cmd = f"jq -r '.bytecode.object' {forge_artifact_path_val}"
-        creation_code = extract_bytecode(jq_creation_cmd, args.optimism_repo_path)
-        info(f"Contract Bytecode: 0x{creation_code[:32]}...")
+def bytecode_blob_path(code_hash, bytecode_dir=BYTECODE_DIR):
+    """Returns the path of the blob holding the bytecode with the given keccak hash."""
+    return os.path.join(bytecode_dir, BYTECODE_STORE, f"{code_hash[2:] if code_hash.startswith('0x') else code_hash}.bin")
 
-        constructor_signature = extract_constructor_signature(args.contract_name, cwd=args.optimism_repo_path + "/packages/contracts-bedrock")
-        estimated_gas = estimate_gas(args.eth_rpc_url, creation_code, constructor_signature, args.constructor_args)
+def read_bytecode_index(bytecode_dir=BYTECODE_DIR):
+    """Returns the bytecode index as a dict of key -> keccak hash, or an empty dict if there is none."""
+    try:
+        with open(os.path.join(bytecode_dir, BYTECODE_INDEX)) as f:
+            return json.load(f)["bytecode"]
+    except (OSError, json.JSONDecodeError, KeyError):
+        return {}
+
+def write_bytecode_index(index, bytecode_dir=BYTECODE_DIR):
+    """Atomically writes the bytecode index, sorted so that diffs stay small."""
+    path = os.path.join(bytecode_dir, BYTECODE_INDEX)
+    tmp_path = f"{path}.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": 1, "bytecode": dict(sorted(index.items()))}, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def store_bytecode(key, bytecode, bytecode_dir=BYTECODE_DIR):
+    """
+    Stores hex encoded bytecode under key and returns its keccak hash. The blob is only written if no
+    blob with the same content exists yet, and the index is only rewritten if the key changed.
+    """
+    data = hex_to_bytes(bytecode)
+    code_hash = "0x" + keccak256(data).hex()
+    blob_path = bytecode_blob_path(code_hash, bytecode_dir)
+    if not os.path.exists(blob_path):
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, blob_path)
+    with _bytecode_index_lock:
+        index = read_bytecode_index(bytecode_dir)
+        if index.get(key) != code_hash:
+            index[key] = code_hash
+            write_bytecode_index(index, bytecode_dir)
+    return code_hash
+
+@contextlib.contextmanager
+def open_bytecode(code_hash, bytecode_dir=BYTECODE_DIR):
+    """Yields a read-only memory map of the stored bytecode with the given hash."""
+    with open(bytecode_blob_path(code_hash, bytecode_dir), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+def write_bytecode_view(key, code_hash, bytecode_dir=BYTECODE_DIR):
+    """Writes the view file of key as 0x-prefixed hex, unless it already holds that bytecode. Returns True if written."""
+    with open_bytecode(code_hash, bytecode_dir) as mapped:
+        content = "0x" + mapped[:].hex() + "\n"
+    path = bytecode_view_path(key, bytecode_dir)
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    with open(path, "w") as f:
+        f.write(content)
+    return True
+
+def bytecode_stored(fork_name, contract_name, code_hash, bytecode_dir=BYTECODE_DIR):
+    """Returns True if the store maps the contract deployment to bytecode with the given hash."""
+    return (read_bytecode_index(bytecode_dir).get(bytecode_key(fork_name, contract_name)) == code_hash
+            and os.path.exists(bytecode_blob_path(code_hash, bytecode_dir)))
+
+def bytecode_main(argv):
+    """
+    Maintains the bytecode store: `view` generates the view files from the index, `import` stores every
+    view file whose content differs from the index, and `gc` removes blobs no index key refers to.
+    """
+    parser = argparse.ArgumentParser(prog="gen_predeploy_docs.py bytecode", description="Maintain the content-addressed bytecode store under specs/static/bytecode.")
+    parser.add_argument("action", choices=["view", "import", "gc"], help="'view' writes the <fork>-<contract>-deployment.txt files from the store, 'import' stores edited or new view files, 'gc' removes unreferenced blobs.")
+    parser.add_argument("--bytecode-dir", type=str, default=BYTECODE_DIR, help="Directory holding the bytecode index, store and view files.")
+    args = parser.parse_args(argv)
+
+    index = read_bytecode_index(args.bytecode_dir)
+    if args.action == "view":
+        written = sum(write_bytecode_view(key, code_hash, args.bytecode_dir) for key, code_hash in sorted(index.items()))
+        success(f"Bytecode view is up to date ({written} of {len(index)} files written).")
+    elif args.action == "import":
+        imported = 0
+        for name in sorted(os.listdir(args.bytecode_dir)):
+            match = BYTECODE_VIEW_PATTERN.match(name)
+            if not match:
+                continue
+            with open(os.path.join(args.bytecode_dir, name)) as f:
+                bytecode = f.read().strip()
+            if not re.fullmatch(r'0x(?:[0-9a-fA-F]{2})+', bytecode):
+                error(f"Error: {name} does not hold hex encoded bytecode.")
+                sys.exit(1)
+            if index.get(match.group(1)) != store_bytecode(match.group(1), bytecode, args.bytecode_dir):
+                info(f"Stored {name}.")
+                imported += 1
+        success(f"Imported {imported} bytecode files.")
+    else:
+        referenced = {bytecode_blob_path(code_hash, args.bytecode_dir) for code_hash in index.values()}
+        store_dir = os.path.join(args.bytecode_dir, BYTECODE_STORE)
+        removed = 0
+        for name in sorted(os.listdir(store_dir)) if os.path.isdir(store_dir) else []:
+            path = os.path.join(store_dir, name)
+            if path not in referenced:
+                os.remove(path)
+                removed += 1
+        success(f"Removed {removed} unreferenced blobs.")
+
+def read_upgrade_config(config_path):
+    """
+    Reads an upgrade config file such as `scripts/upgrades/jovian.sh` without sourcing it. Returns its
+    constants, and every entry of its `contracts` array as a dict with the contract_name, proxy_address,
+    whether it is enabled (not commented out) and its line index. A commented-out line is an entry if
+    what follows the `#` is quoted like one.
+    """
+    constants = {}
+    entries = []
+    in_contracts = False
+    with open(config_path) as f:
+        for index, line in enumerate(f):
+            if in_contracts:
+                code = line.strip()
+                enabled = not code.startswith("#")
+                if not enabled:
+                    code = code.lstrip("#").strip()
+                    # Prose comments between the entries are not entries
+                    if not code.startswith(('"', "'")):
+                        continue
+                for token in shlex.split(code, comments=True):
+                    if token == ")":
+                        in_contracts = False
+                        break
+                    contract_name, _, proxy_address = token.partition(":")
+                    entries.append({"contract_name": contract_name, "proxy_address": proxy_address,
+                                    "enabled": enabled, "line": index})
+                continue
+            tokens = shlex.split(line, comments=True)
+            if not tokens:
+                continue
+            if tokens[:2] == ["declare", "-a"] and len(tokens) > 2 and tokens[2].startswith("contracts=("):
+                in_contracts = True
+            elif "=" in tokens[0]:
+                key, _, value = tokens[0].partition("=")
+                constants[key] = value
+    return constants, entries
+
+def parse_upgrade_config(config_path, require_contracts=True):
+    """
+    Parses an upgrade config file with read_upgrade_config(). Returns a dict with the GIT_COMMIT_HASH,
+    FROM_ADDRESS, FROM_ADDRESS_NONCE and FORK_NAME constants, the uncommented `contracts` entries as
+    (contract_name, proxy_address) tuples, and all `entries`, commented out or not.
+    Unless require_contracts is False, a config without uncommented entries is rejected.
+    """
+    constants, entries = read_upgrade_config(config_path)
+    contracts = [(entry["contract_name"], entry["proxy_address"]) for entry in entries if entry["enabled"]]
+    required = ["GIT_COMMIT_HASH", "FROM_ADDRESS", "FROM_ADDRESS_NONCE", "FORK_NAME"]
+    missing = [key for key in required if not constants.get(key)]
+    if require_contracts and not contracts:
+        missing.append("contracts")
+    if missing:
+        raise ValueError(f"Upgrade config {config_path} is missing: {', '.join(missing)}")
+    return {
+        "path": config_path,
+        "git_commit_hash": constants["GIT_COMMIT_HASH"],
+        "from_address": constants["FROM_ADDRESS"],
+        "from_address_nonce": int(constants["FROM_ADDRESS_NONCE"]),
+        "fork_name": constants["FORK_NAME"],
+        "contracts": contracts,
+        "entries": entries,
+    }
+
+# Stage scheduling. A run is described as a graph of stages, each a (dependencies, function) pair keyed by
+# name. A stage's function receives the results of its dependencies as a dict and returns its own result.
+# run_stages() starts every stage as soon as its dependencies are done, in threads driven by asyncio, so
+# stages without a dependency between them (e.g. RPC warm-up and the build) overlap.
+
+def stage_order(stages):
+    """Returns the stage names in dependency order, raising ValueError for unknown dependencies or cycles."""
+    order = []
+    state = {}
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Stage dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = "visiting"
+        for dependency in stages[name][0]:
+            if dependency not in stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+            visit(dependency, path + [name])
+        state[name] = "done"
+        order.append(name)
+    for name in stages:
+        visit(name, [])
+    return order
+
+class _StageExit(Exception):
+    """Carries a SystemExit raised by a stage out of the event loop, which does not propagate it from tasks cleanly."""
+
+async def _run_stages(stages):
+    import asyncio
+    tasks = {}
+
+    async def run(name):
+        dependencies, function = stages[name]
+        inputs = {dependency: await tasks[dependency] for dependency in dependencies}
+
+        def call():
+            with trace_phase(name, category="stage"):
+                try:
+                    return function(inputs)
+                except SystemExit as e:
+                    raise _StageExit(e.code) from None
+        return await asyncio.to_thread(call)
+
+    for name in stage_order(stages):
+        tasks[name] = asyncio.ensure_future(run(name))
+    await asyncio.gather(*tasks.values())
+    return {name: task.result() for name, task in tasks.items()}
+
+def run_stages(stages):
+    """Runs a stage graph to completion and returns the result of every stage by name."""
+    import asyncio
+    try:
+        return asyncio.run(_run_stages(stages))
+    except _StageExit as e:
+        sys.exit(e.args[0])
 
-        data_path_result = data_path(args.fork_name, args.contract_name)
+def contract_stages(fork_name, contract_name, from_address, from_address_nonce, git_commit_hash, gas_settings,
+                    constructor_args, proxy_address, copy_contract_bytecode, command, optimism_repo_path):
+    """
+    Returns the stages that derive every parameter of a contract deployment (and optional proxy update),
+    ending in "params" with the template data. They read the built artifacts from the directory returned
+    by an "artifacts_dir" stage, which the caller adds; the address and hash stages do not wait for it.
+    The printed store hint refers to optimism_repo_path, since the artifacts directory may be a worktree
+    that is gone by the time the user runs it.
+    """
+    intent = f"{fork_name}: {contract_name} Deployment"
+    forge_artifact_path_val = forge_artifact_path(contract_name)
+    data_path_result = data_path(fork_name, contract_name)
+
+    def source_hash(_):
+        with trace_phase("hash", intent=intent):
+            result = compute_source_hash(intent)
+        info(f"Source Hash: {result}")
+        return result
+
+    def proxy_update(inputs):
+        if not proxy_address:
+            return {}
+        proxy_intent = f"{fork_name}: {contract_name} Proxy Update"
+        return {
+            "proxy_address": proxy_address,
+            "proxy_source_hash": compute_source_hash(proxy_intent),
+            "proxy_data": compute_proxy_update_data(inputs["deployed_address"]),
+            "proxy_intent": proxy_intent,
+        }
 
+    def artifact(inputs):
+        loaded = load_artifact(forge_artifact_path_val, inputs["artifacts_dir"])
+        info(f"Contract Bytecode: 0x{unprefixed_hex(loaded['bytecode'])[:32]}...")
+        return loaded
+
+    def store(inputs):
+        creation_code = inputs["artifact"]["bytecode"]
+        if copy_contract_bytecode:
+            key = bytecode_key(fork_name, contract_name)
+            write_bytecode_view(key, store_bytecode(key, creation_code))
+            success(f"Stored contract bytecode as {key} and updated {data_path_result}")
+        else:
+            info(f"Final step: with {git_commit_hash} built in {optimism_repo_path}, copy the contract bytecode to "
+                 f"{data_path_result} and store it with the following commands:\n")
+            print(f"jq -r '.bytecode.object' {optimism_repo_path}/{forge_artifact_path_val} > {data_path_result}\n"
+                  f"python3 {os.path.relpath(os.path.abspath(__file__))} bytecode import\n", file=sys.stderr)
 
+    def params(inputs):
+        creation_code = inputs["artifact"]["bytecode"]
         template_data = {
-            "fork_name": args.fork_name,
-            "contract_name": args.contract_name,
+            "fork_name": fork_name,
+            "contract_name": contract_name,
             "intent": intent,
 
             # Comment from @geoknee on args.from_address: It would be great if there was some way we could ensure that
@@ -433,38 +1617,869 @@ def main():
             # In lieu of automation around this, we can instruct the user to choose an
             # unused address or suggest they just increment the previous address which was
             # used (going in order through the hardforks).
-            "from_address": args.from_address,
-            "from_address_nonce": args.from_address_nonce,
-            "gas_limit": estimated_gas,
-            "data_bytecode_head": "0x" + creation_code[:32] + "...",
+            #
+            # preflight_deployments() now checks both against --eth-rpc-url alongside the build.
+            "from_address": from_address,
+            "from_address_nonce": from_address_nonce,
+            "gas_limit": inputs["gas_limit"],
+            "data_bytecode_head": "0x" + unprefixed_hex(creation_code)[:32] + "...",
             "data_path": data_path_result,
-            "git_commit_hash": args.git_commit_hash,
-            "contract_code_hash": contract_code_hash,
-            "source_hash": source_hash,
-            "deployed_address": deployed_address,
-            "command": "./scripts/run_gen_predeploy_docs.sh " + format_args_with_alternate_newlines(sys.argv[1:]),
+            "git_commit_hash": git_commit_hash,
+            "contract_code_hash": inputs["contract_code_hash"],
+            "source_hash": inputs["source_hash"],
+            "deployed_address": inputs["deployed_address"],
+            "command": command,
             "forge_artifact_path_data": forge_artifact_path_val,
+            "creation_code_hash": compute_code_hash(creation_code),
         }
-        if args.proxy_address:
-            proxy_intent = f"{args.fork_name}: {args.contract_name} Proxy Update"
-            proxy_data = compute_proxy_update_data(deployed_address)
-            proxy_source_hash = compute_keccak(compute_concat_hex(SOURCE_HASH_PREFIX, compute_keccak(proxy_intent)))
-            template_data["proxy_address"] = args.proxy_address
-            template_data["proxy_source_hash"] = proxy_source_hash
-            template_data["proxy_data"] = proxy_data
-            template_data["proxy_intent"] = proxy_intent
+        template_data.update(inputs["proxy_update"])
+        return template_data
+
+    info(f"Deriving parameters for {intent}...")
+    return {
+        "deployed_address": ((), lambda _: compute_deployed_address(from_address, from_address_nonce)),
+        "source_hash": ((), source_hash),
+        "proxy_update": (("deployed_address",), proxy_update),
+        "artifact": (("artifacts_dir",), artifact),
+        "contract_code_hash": (("artifact", "artifacts_dir"), lambda inputs: artifact_code_hash(forge_artifact_path_val, inputs["artifacts_dir"])),
+        "constructor_signature": (("artifact",), lambda inputs: parse_constructor_signature(inputs["artifact"]["abi"])),
+        "gas_limit": (("artifact", "constructor_signature"), lambda inputs: estimate_gas(
+            gas_settings, inputs["artifact"]["bytecode"], inputs["constructor_signature"], constructor_args)),
+        "store": (("artifact",), store),
+        "params": (("artifact", "gas_limit", "contract_code_hash", "source_hash", "deployed_address", "proxy_update", "store"), params),
+    }
+
+# Compiled templates. Templates load through a jinja2 environment per template directory (or one holding the
+# built-in JINJA_TEMPLATE), and jinja2's FileSystemBytecodeCache keeps their compiled code on disk, checked
+# against the source, so jinja2 only parses and compiles a template again when it changes.
+
+TEMPLATE_CACHE_DIR = os.path.join(DEFAULT_CACHE_ROOT, "templates")
+
+_template_lock = threading.Lock()
+_template_environments = {}
+
+def template_environment(template_dir=None):
+    """Returns the jinja2 environment loading templates from template_dir, or the built-in JINJA_TEMPLATE if None."""
+    with _template_lock:
+        if template_dir not in _template_environments:
+            import jinja2
+            if template_dir is None:
+                loader = jinja2.DictLoader({"JINJA_TEMPLATE": JINJA_TEMPLATE})
+            else:
+                loader = jinja2.FileSystemLoader(template_dir)
+            try:
+                os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+            except OSError:
+                bytecode_cache = None
+            _template_environments[template_dir] = jinja2.Environment(loader=loader, bytecode_cache=bytecode_cache)
+        return _template_environments[template_dir]
+
+def load_template(template_path=None):
+    """Returns the compiled Jinja template at template_path, or of JINJA_TEMPLATE, compiling it at most once per change."""
+    if not template_path:
+        return template_environment().get_template("JINJA_TEMPLATE")
+    template_dir, template_name = os.path.split(os.path.abspath(template_path))
+    return template_environment(template_dir).get_template(template_name)
+
+def add_template_args(parser):
+    """Adds the template option to an argument parser."""
+    parser.add_argument("--template-path", type=str, default=None, help="Path to a Jinja template to render instead of the built-in one.")
+
+def render_template(data, template_path=None):
+    """Render the Jinja2 template at template_path, or the built-in one, with the provided data."""
+    with trace_phase("render", contract=data["contract_name"]):
+        return load_template(template_path).render(params=data)
+
+def derive_contract_params(artifacts_dir, fork_name, contract_name, from_address, from_address_nonce, git_commit_hash,
+                           gas_settings, constructor_args, proxy_address, copy_contract_bytecode, command,
+                           optimism_repo_path):
+    """
+    Derives every parameter of a contract deployment (and optional proxy update) from the built artifacts
+    under artifacts_dir (the Optimism repo or an artifact cache entry), and returns the template data.
+    """
+    stages = contract_stages(fork_name, contract_name, from_address, from_address_nonce, git_commit_hash, gas_settings,
+                             constructor_args, proxy_address, copy_contract_bytecode, command, optimism_repo_path)
+    stages["artifacts_dir"] = ((), lambda _: artifacts_dir)
+    with trace_phase("derive", contract=contract_name):
+        return run_stages(stages)["params"]
+
+def generated_with_command(cli_args):
+    """Returns the `Generated with` command embedded in the rendered markdown for the given CLI arguments."""
+    return "./scripts/run_gen_predeploy_docs.sh " + format_args_with_alternate_newlines(cli_args)
+
+def ensure_dependencies():
+    """Runs check_dependencies, exiting with an error message if anything is missing."""
+    try:
+        check_dependencies()
+    except EnvironmentError as e:
+        error(f"Dependency check failed: {e}")
+        sys.exit(1)
+
+def validate_repo(repo_dir):
+    """Validates the Optimism repo path, exiting on failure."""
+    if not os.path.isdir(repo_dir):
+        error(f"Error: Provided Optimism repo directory does not exist or is not a directory: {repo_dir}")
+        sys.exit(1)
+    if not os.path.exists(os.path.join(repo_dir, ".git")):
+        warning(f"Warning: Provided directory does not appear to be a git repository: {repo_dir}")
+
+# Verification of the upgrade transaction sections already committed to the spec tree. Every value that
+# can be derived without a build or network access is recomputed: CREATE addresses, sourceHashes,
+# upgradeTo calldata, and the bytecode files the `data` attributes link to.
+
+UPGRADE_TO_SELECTOR = "0x3659cfe6"
+
+SECTION_HEADING_PATTERN = re.compile(r'^#{2,4} (.+)$', re.MULTILINE)
+BULLET_PATTERN = re.compile(r'^- `(\w+)`: `([^`]*)`(.*)$', re.MULTILINE)
+INTENT_PATTERN = re.compile(r'intent = "([^"]+)"')
+DEPLOYED_TO_PATTERN = re.compile(r'deployed to\s+`(0x[0-9a-fA-F]{40})`')
+FULL_BYTECODE_PATTERN = re.compile(r'\(\[full bytecode\]\(([^)]+)\)\)')
+COMPUTE_ADDRESS_SNIPPET_PATTERN = re.compile(
+    r'cast compute-address --nonce[= ](\d+) (0x[0-9a-fA-F]{40})\s*\n#? ?Computed Address: (0x[0-9a-fA-F]{40})')
+SOURCE_HASH_SNIPPET_PATTERN = re.compile(
+    r'cast keccak \$\(cast concat-hex 0x0{63}2 \$\(cast keccak "([^"]+)"\)\)\s*\n# (0x[0-9a-fA-F]{64})')
+UPGRADE_TO_SNIPPET_PATTERN = re.compile(
+    r'cast concat-hex \$\(cast sig "upgradeTo\(address\)"\) \$\(cast abi-encode "upgradeTo\(address\)" (0x[0-9a-fA-F]{40})\)\s*\n# (0x[0-9a-fA-F]+)')
+
+def split_sections(markdown):
+    """Splits markdown into (heading, body) pairs at each `##` to `####` heading."""
+    matches = list(SECTION_HEADING_PATTERN.finditer(markdown))
+    return [(m.group(1).strip(), markdown[m.end():matches[i + 1].start() if i + 1 < len(matches) else len(markdown)])
+            for i, m in enumerate(matches)]
+
+def parse_upgrade_section(body):
+    """Returns the `- \`name\`: \`value\`` attributes of a section, plus the intent and deployed address if present."""
+    attributes = {}
+    for match in BULLET_PATTERN.finditer(body):
+        attributes.setdefault(match.group(1), (match.group(2), match.group(3)))
+    intent = INTENT_PATTERN.search(body)
+    deployed_to = DEPLOYED_TO_PATTERN.search(body)
+    return {
+        "attributes": attributes,
+        "intent": intent.group(1) if intent else None,
+        "deployed_address": deployed_to.group(1) if deployed_to else None,
+    }
+
+def verification_result(check, expected, actual, ok=None):
+    """Returns one entry of the verification report."""
+    return {"check": check, "expected": expected, "actual": actual,
+            "ok": (expected.lower() == actual.lower()) if ok is None else ok}
+
+def verify_bytecode_file(md_path, data_value, link):
+    """
+    Checks that a linked bytecode file resolves to stored bytecode that matches its hash and starts with
+    the `data` prefix shown in the spec. Links outside the store are checked against the file itself.
+    """
+    bytecode_path = os.path.normpath(os.path.join(os.path.dirname(md_path), link))
+    # Sections committed before the generator stopped doubling the prefix read "0x0x6080...", which still
+    # identifies the same bytecode
+    head = data_value.rstrip(".")
+    head = "0x" + head[4:] if head.startswith("0x0x") else head
+    bytecode_dir, name = os.path.split(bytecode_path)
+    match = BYTECODE_VIEW_PATTERN.match(name)
+    code_hash = read_bytecode_index(bytecode_dir).get(match.group(1)) if match else None
+    if code_hash:
+        try:
+            with open_bytecode(code_hash, bytecode_dir) as mapped, memoryview(mapped) as view:
+                if "0x" + keccak256(view).hex() != code_hash:
+                    return verification_result("bytecode_file", code_hash, f"corrupted blob for {name}", ok=False)
+                content = "0x" + mapped[:(len(head) - 1) // 2].hex()
+        except (OSError, ValueError):
+            return verification_result("bytecode_file", bytecode_blob_path(code_hash, bytecode_dir), "missing", ok=False)
+        return verification_result("bytecode_file", head + "...", content[:len(head)] + "...", ok=content.startswith(head.lower()))
+    if not os.path.exists(bytecode_path):
+        return verification_result("bytecode_file", bytecode_path, "missing", ok=False)
+    with open(bytecode_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        content = mapped[:].strip().decode()
+    if not re.fullmatch(r'0x(?:[0-9a-fA-F]{2})*', content):
+        return verification_result("bytecode_file", "hex encoded bytecode", f"invalid content in {bytecode_path}", ok=False)
+    return verification_result("bytecode_file", head + "...", content[:len(head)] + "...", ok=content.startswith(head))
+
+def section_contract_key(heading, suffix):
+    """Returns the normalized contract name of a "<contract> Deployment" or "<contract> Proxy Update" heading, or None."""
+    if not heading.lower().endswith(suffix):
+        return None
+    return heading[:-len(suffix)].replace(" ", "").lower()
+
+def verify_upgrade_section(task):
+    """Recomputes every derivable value of one section. task is (md_path, heading, body, deployments)."""
+    md_path, heading, body, deployments = task
+    section = parse_upgrade_section(body)
+    attributes = section["attributes"]
+    results = []
+
+    if "sourceHash" in attributes and section["intent"]:
+        results.append(verification_result("source_hash", compute_source_hash(section["intent"]), attributes["sourceHash"][0]))
+    for intent, listed in SOURCE_HASH_SNIPPET_PATTERN.findall(body):
+        results.append(verification_result("source_hash_snippet", compute_source_hash(intent), listed))
+
+    from_address = attributes.get("from", ("", ""))[0]
+    if section["deployed_address"] and re.fullmatch(r'0x[0-9a-fA-F]{40}', from_address):
+        nonce = int(attributes.get("nonce", ("0", ""))[0])
+        results.append(verification_result("deployed_address", compute_create_address(from_address, nonce), section["deployed_address"]))
+    for nonce, address, listed in COMPUTE_ADDRESS_SNIPPET_PATTERN.findall(body):
+        results.append(verification_result("compute_address_snippet", compute_create_address(address, int(nonce)), listed))
+        if attributes.get("to", ("", ""))[0] == "null" and re.fullmatch(r'0x[0-9a-fA-F]{40}', from_address) and listed.lower() != compute_create_address(from_address, int(nonce)).lower():
+            results.append(verification_result("compute_address_snippet_from", from_address, address))
+
+    data_value, data_rest = attributes.get("data", ("", ""))
+    if data_value.startswith(UPGRADE_TO_SELECTOR) and section_contract_key(heading, " proxy update"):
+        implementation = deployments.get(section_contract_key(heading, " proxy update"))
+        if implementation:
+            results.append(verification_result("proxy_data", encode_upgrade_to_calldata(implementation), data_value))
+    for address, listed in UPGRADE_TO_SNIPPET_PATTERN.findall(body):
+        results.append(verification_result("proxy_data_snippet", encode_upgrade_to_calldata(address), listed))
+
+    link = FULL_BYTECODE_PATTERN.search(data_rest)
+    if link:
+        results.append(verify_bytecode_file(md_path, data_value, link.group(1)))
+
+    for result in results:
+        result["file"] = os.path.relpath(md_path, os.path.dirname(SPECS_DIR))
+        result["section"] = heading
+    return results
+
+def upgrade_section_tasks(md_path):
+    """Returns the verification tasks for the upgrade transaction sections of one markdown file."""
+    with open(md_path) as f:
+        markdown = f.read()
+    sections = [(heading, body) for heading, body in split_sections(markdown) if "`sourceHash`:" in body]
+    deployments = {}
+    for heading, body in sections:
+        deployed_address = parse_upgrade_section(body)["deployed_address"]
+        if section_contract_key(heading, " deployment") and deployed_address:
+            deployments[section_contract_key(heading, " deployment")] = deployed_address
+    return [(md_path, heading, body, deployments) for heading, body in sections]
+
+# Known answers for the native keccak256, RLP and ABI helpers, checked before the specs are: keccak256 test
+# vectors (including an input of exactly one rate block and one spanning several), the classic CREATE
+# address example, and values published in the Jovian spec. The pure Python keccak256 is checked even when
+# pycryptodome is installed, since runs without it rely on it alone.
+
+KECCAK256_KNOWN_ANSWERS = [
+    (b"", "0xc5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470"),
+    (b"The quick brown fox jumps over the lazy dog", "0x4d741b6f1eb29cb2a9b9911c82f56fa8d73b04959d3d9d222895df6c0b28aa15"),
+    (bytes(KECCAK_RATE), "0x3a5912a7c5faa06ee4fe906253e339467a9ce87d533c65be3c15cb231cdb25f9"),
+    (bytes(range(256)) * 2, "0xf55ba327291604f0e5be6651752398b7be2331aad65f5763ce067df95cc13be1"),
+]
+CREATE_ADDRESS_KNOWN_ANSWERS = [
+    ("0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", 0, "0xcd234a471b72ba2f1ccf0a70fcaba648a5eecd8d"),
+    ("0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", 1, "0x343c43a37d37dff08ae8c4a11544c718abb4fcf8"),
+    ("0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", 2, "0xf778b86fa74e846c4f0a1fbd1335fe81c00a0c91"),
+    ("0x4210000000000000000000000000000000000006", 0, "0x3Ba4007f5C922FBb33C454B41ea7a1f11E83df2C"),
+    ("0x4210000000000000000000000000000000000007", 0, "0x4f1db3c6AbD250ba86E0928471A8F7DB3AFd88F1"),
+]
+SOURCE_HASH_KNOWN_ANSWERS = [
+    ("Jovian: L1Block Deployment", "0x98faf23b9795967bc0b1c543144739d50dba3ea40420e77ad6ca9848dbfb62e8"),
+    ("Jovian: L1Block Proxy Update", "0x08447273a4fbce97bc8c515f97ac74efc461f6a4001553712f31ebc11288bad2"),
+]
+UPGRADE_TO_KNOWN_ANSWERS = [
+    ("0x3Ba4007f5C922FBb33C454B41ea7a1f11E83df2C", "0x3659cfe60000000000000000000000003ba4007f5c922fbb33c454b41ea7a1f11e83df2c"),
+]
+
+def self_test_results():
+    """Checks the native helpers against their known answers and returns the results as verification entries."""
+    results = []
+    for data, expected in KECCAK256_KNOWN_ANSWERS:
+        results.append(verification_result("self_test_keccak256", expected, "0x" + keccak256(data).hex()))
+        results.append(verification_result("self_test_keccak256_pure", expected, "0x" + _keccak256_pure(data).hex()))
+    for from_address, nonce, expected in CREATE_ADDRESS_KNOWN_ANSWERS:
+        actual = compute_create_address(from_address, nonce)
+        # Checksummed answers also check the EIP-55 casing
+        results.append(verification_result("self_test_create_address", expected, actual,
+                                           ok=actual == expected if expected != expected.lower() else None))
+    for intent, expected in SOURCE_HASH_KNOWN_ANSWERS:
+        results.append(verification_result("self_test_source_hash", expected, compute_source_hash(intent)))
+    for address, expected in UPGRADE_TO_KNOWN_ANSWERS:
+        results.append(verification_result("self_test_upgrade_to", expected, encode_upgrade_to_calldata(address)))
+    for result in results:
+        result["file"] = os.path.relpath(os.path.abspath(__file__), os.path.dirname(SPECS_DIR))
+        result["section"] = "self test"
+    return results
+
+def verify_specs(specs_dir, jobs):
+    """Verifies every upgrade transaction section under specs_dir across a process pool and returns the report."""
+    import concurrent.futures
+    md_paths = sorted(os.path.join(root, name) for root, _, names in os.walk(specs_dir) for name in names if name.endswith(".md"))
+    tasks = [task for md_path in md_paths for task in upgrade_section_tasks(md_path)]
+    results = self_test_results()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results += [result for section_results in executor.map(verify_upgrade_section, tasks, chunksize=4) for result in section_results]
+
+    referenced = {os.path.normpath(os.path.join(os.path.dirname(md_path), FULL_BYTECODE_PATTERN.search(body).group(1)))
+                  for md_path, _, body, _ in tasks if FULL_BYTECODE_PATTERN.search(body)}
+    bytecode_dir = os.path.join(specs_dir, "static", "bytecode")
+    for key in sorted(read_bytecode_index(bytecode_dir)):
+        path = os.path.normpath(bytecode_view_path(key, bytecode_dir))
+        result = verification_result("bytecode_file_referenced", "referenced by a spec", "referenced" if path in referenced else "unreferenced", ok=path in referenced)
+        result["file"] = os.path.relpath(path, os.path.dirname(SPECS_DIR))
+        result["section"] = None
+        results.append(result)
+
+    failures = [result for result in results if not result["ok"]]
+    return {
+        "ok": not failures,
+        "summary": {"files": len(md_paths), "sections": len(tasks), "checks": len(results), "failures": len(failures)},
+        "results": results,
+    }
+
+def verify_main(argv):
+    """Verifies the generated upgrade transaction sections in the spec tree, without builds or network access."""
+    parser = argparse.ArgumentParser(prog="gen_predeploy_docs.py verify", description="Recompute and check every derivable value of the upgrade transaction sections in the specs.")
+    parser.add_argument("--specs-dir", type=str, default=SPECS_DIR, help="Root of the markdown specs to scan.")
+    parser.add_argument("--report", type=str, default="-", help="Path of the JSON report, '-' for stdout.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    args = parser.parse_args(argv)
+
+    report = verify_specs(args.specs_dir, args.jobs)
+    for result in report["results"]:
+        if not result["ok"]:
+            error(f"{result['file']}: {result['section']}: {result['check']}: expected {result['expected']}, found {result['actual']}")
+    summary = report["summary"]
+    (success if report["ok"] else error)(f"Verified {summary['checks']} values in {summary['sections']} sections of {summary['files']} files, {summary['failures']} failed.")
+    if args.report == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["ok"] else 1)
+
+# Lockfiles record, next to each upgrade config, the inputs and derived outputs of every contract so that
+# a rerun only recomputes contracts whose inputs changed.
+
+# Version 2 entries render `data` with a single 0x prefix
+LOCKFILE_VERSION = 2
+
+def lockfile_path(config_path):
+    """Returns the lockfile path for an upgrade config, e.g. upgrades/interop.sh -> upgrades/interop.lock.json."""
+    return os.path.splitext(config_path)[0] + ".lock.json"
+
+def read_lockfile(path):
+    """Returns the lockfile entries by contract name, or an empty dict if there is no usable lockfile."""
+    try:
+        with open(path) as f:
+            lockfile = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if lockfile.get("version") != LOCKFILE_VERSION:
+        return {}
+    return {entry["inputs"]["contract_name"]: entry for entry in lockfile.get("contracts", [])}
+
+def write_lockfile(path, entries):
+    """Writes the lockfile entries in config order."""
+    with open(path, "w") as f:
+        json.dump({"version": LOCKFILE_VERSION, "contracts": entries}, f, indent=2)
+        f.write("\n")
+
+def contract_lock_inputs(job, gas_scope, build_mode):
+    """
+    Returns the inputs of a contract job that determine its derived outputs, except the artifact hash.
+    gas_scope is the gas_cache_scope() of the run, so gas limits are never reused across networks.
+    """
+    return {
+        "git_commit_hash": job["git_commit_hash"],
+        "fork_name": job["fork_name"],
+        "contract_name": job["contract_name"],
+        "from_address": job["from_address"],
+        "from_address_nonce": job["from_address_nonce"],
+        "constructor_args": job["constructor_args"],
+        "proxy_address": job["proxy_address"],
+        "gas_scope": gas_scope,
+        "build_mode": build_mode,
+    }
+
+def load_upgrade_configs(config_paths):
+    """Parses every upgrade config, exiting with an error message if one cannot be loaded."""
+    configs = []
+    for config_path in config_paths:
+        try:
+            configs.append(parse_upgrade_config(config_path))
+        except (OSError, ValueError) as e:
+            error(f"Failed to load upgrade config: {e}")
+            sys.exit(1)
+    return configs
+
+def upgrade_contract_jobs(configs, args):
+    """
+    Returns one job dict per contract of the configs, in config order, with the inputs of
+    derive_contract_params() and the `Generated with` command. The from address is incremented between
+    the contracts of a config, matching generate_upgrade_tx_specs.sh.
+    """
+    contract_jobs = []
+    for config in configs:
+        from_address = config["from_address"]
+        for contract_name, proxy_address in config["contracts"]:
+            cli_args = [
+                "--optimism-repo-path", args.optimism_repo_path,
+                "--fork-name", config["fork_name"],
+                "--contract-name", contract_name,
+                "--from-address", from_address,
+                "--from-address-nonce", str(config["from_address_nonce"]),
+                "--git-commit-hash", config["git_commit_hash"],
+            ]
+            if args.eth_rpc_url:
+                cli_args += ["--eth-rpc-url", args.eth_rpc_url]
+            if args.gas_backend != "rpc":
+                cli_args += ["--gas-backend", args.gas_backend]
+            cli_args += ["--proxy-address", proxy_address]
+            if args.copy_contract_bytecode:
+                # The recorded command is for the single-contract CLI, whose flag still takes a value
+                cli_args += ["--copy-contract-bytecode", "true"]
+            contract_jobs.append({
+                "config_path": config["path"],
+                "fork_name": config["fork_name"],
+                "contract_name": contract_name,
+                "from_address": from_address,
+                "from_address_nonce": config["from_address_nonce"],
+                "git_commit_hash": config["git_commit_hash"],
+                "constructor_args": None,
+                "proxy_address": proxy_address,
+                "command": generated_with_command(cli_args),
+            })
+            # Each deployment uses a fresh from address with the configured nonce
+            from_address = inc_hex(from_address)
+    return contract_jobs
+
+def batch_main(argv):
+    """
+    Generates the docs for every contract of one or more upgrade configs. Each distinct commit is built
+    once, in its own worktree, with builds for different commits running in parallel.
+    """
+    import concurrent.futures
+    parser = argparse.ArgumentParser(prog="gen_predeploy_docs.py batch", description="Generate the upgrade transaction docs for every contract in one or more upgrade configs.")
+    parser.add_argument("--upgrade-config", type=str, nargs="+", required=True, help="Path to the upgrade config file(s) (e.g., scripts/upgrades/jovian.sh)")
+    parser.add_argument("--optimism-repo-path", type=str, required=True, help="Path to the Optimism repository directory.")
+    add_gas_estimation_args(parser)
+    add_preflight_args(parser)
+    parser.add_argument("--copy-contract-bytecode", action="store_true", help="Copy the contract bytecode to the data path.")
+    parser.add_argument("--build-jobs", type=int, default=os.cpu_count() or 1, help="Maximum number of commits built in parallel.")
+    parser.add_argument("--jobs", type=int, default=min(32, (os.cpu_count() or 1) + 4), help="Maximum number of contracts derived in parallel after the build.")
+    parser.add_argument("--no-lockfile", action="store_true", help="Rederive every contract and do not read or write the lockfile next to each upgrade config.")
+    add_template_args(parser)
+    add_artifact_cache_args(parser)
+    add_trace_args(parser)
+
+    args = parser.parse_args(argv)
+    start_tracing(args.trace)
+    gas_settings = gas_estimation_settings(parser, args)
+    ensure_dependencies()
+
+    configs = load_upgrade_configs(args.upgrade_config)
+    contract_jobs = upgrade_contract_jobs(configs, args)
+
+    # A contract is only rederived when its inputs differ from its lockfile entry, or when its bytecode
+    # file needs to be written and is missing or out of date, and only those contracts are looked up in
+    # the artifact cache or built. Up to date contracts whose artifact comes out of the same cache entry
+    # or build also get their artifact hash rechecked against the lockfile.
+    try:
+        gas_scope = gas_cache_scope(gas_settings)
+    except (OSError, RuntimeError, ValueError) as e:
+        error(f"Error resolving the {gas_settings['backend']} gas backend: {e}")
+        sys.exit(1)
+    lock_entries = {config["path"]: {} if args.no_lockfile else read_lockfile(lockfile_path(config["path"])) for config in configs}
+    for job in contract_jobs:
+        job["inputs"] = contract_lock_inputs(job, gas_scope, args.build_mode)
+        entry = lock_entries[job["config_path"]].get(job["contract_name"])
+        job["locked"] = entry if entry and entry["inputs"] == job["inputs"] else None
+        if job["locked"] and args.copy_contract_bytecode and not bytecode_stored(
+                job["fork_name"], job["contract_name"], job["locked"]["outputs"]["creation_code_hash"]):
+            job["locked"] = None
+
+    commit_contract_names = {}
+    for job in contract_jobs:
+        if job["locked"]:
+            continue
+        names = commit_contract_names.setdefault(job["git_commit_hash"], [])
+        if job["contract_name"] not in names:
+            names.append(job["contract_name"])
+    info(f"{len(contract_jobs) - sum(1 for job in contract_jobs if not job['locked'])} of {len(contract_jobs)} contracts are up to date in the lockfiles.")
+    run_preflight(args, [(f"{job['fork_name']}: {job['contract_name']}", job["from_address"], job["from_address_nonce"])
+                         for job in contract_jobs if not job["locked"]])
+
+    cache_dir, cache_max_bytes = artifact_cache_settings(args)
+    with contract_artifacts(args.optimism_repo_path, commit_contract_names, cache_dir, cache_max_bytes,
+                            args.build_jobs, args.scratch_dir, args.build_mode) as artifacts_dirs:
+        for job in contract_jobs:
+            artifacts_dir = artifacts_dirs.get(job["git_commit_hash"])
+            job["artifacts_dir"] = artifacts_dir
+            if artifacts_dir and (not job["locked"] or os.path.exists(os.path.join(artifacts_dir, forge_artifact_path(job["contract_name"])))):
+                job["artifact_sha256"] = file_sha256(os.path.join(artifacts_dir, forge_artifact_path(job["contract_name"])))
+                if job["locked"] and job["locked"]["artifact_sha256"] != job["artifact_sha256"]:
+                    job["locked"] = None
+            else:
+                job["artifact_sha256"] = job["locked"]["artifact_sha256"]
+
+        def derive(job):
+            if job["locked"]:
+                return dict(job["locked"]["outputs"], command=job["command"])
+            return derive_contract_params(
+                job["artifacts_dir"], job["fork_name"], job["contract_name"], job["from_address"],
+                job["from_address_nonce"], job["git_commit_hash"], gas_settings, job["constructor_args"],
+                job["proxy_address"], args.copy_contract_bytecode, job["command"], args.optimism_repo_path)
+
+        # Contracts are independent once built, and mostly wait on subprocesses and RPC calls.
+        # executor.map() keeps the results in config order so the output stays deterministic.
+        info(f"Deriving {len(contract_jobs)} contracts with up to {args.jobs} workers...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            contract_params = list(executor.map(derive, contract_jobs))
+
+    if not args.no_lockfile:
+        for config in configs:
+            write_lockfile(lockfile_path(config["path"]), [
+                {"inputs": job["inputs"], "artifact_sha256": job["artifact_sha256"],
+                 "outputs": {key: value for key, value in params.items() if key != "command"}}
+                for job, params in zip(contract_jobs, contract_params) if job["config_path"] == config["path"]])
+
+    info(f"\n-- Rendered Template --")
+    print("".join(render_template(params, args.template_path) for params in contract_params), end="")
+    info(f"\n--- End Rendered Template ---\n")
+
+# Watch mode. The generator stays running against the live Optimism checkout, keeps the parsed artifacts
+# and rendered sections in memory, and re-renders only the contracts whose artifacts changed after each
+# `forge build`. Changes are picked up with inotify where available, and by polling elsewhere.
+
+INOTIFY_EVENTS = 0x2 | 0x8 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800  # MODIFY, CLOSE_WRITE, MOVED_TO, CREATE, DELETE, DELETE_SELF, MOVE_SELF
+
+def open_inotify():
+    """Returns (libc, fd) of a new non-blocking inotify instance, or None where inotify is unavailable."""
+    import ctypes
+    import ctypes.util
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    return (libc, fd) if fd >= 0 else None
+
+def watch_for_changes(watch_dirs, poll_interval, debounce):
+    """
+    Yields whenever files in watch_dirs may have changed: after a burst of inotify events has been quiet
+    for `debounce` seconds, and at least every poll_interval seconds so directories created later, or
+    changes on systems without inotify, are still noticed. Callers compare file fingerprints to find out
+    what actually changed.
+    """
+    import select
+    inotify = open_inotify()
+    if inotify is None:
+        info(f"inotify is unavailable, polling for changes every {poll_interval}s.")
+        while True:
+            time.sleep(poll_interval)
+            yield
+    libc, fd = inotify
+    try:
+        while True:
+            for watch_dir in watch_dirs:
+                if os.path.isdir(watch_dir):
+                    libc.inotify_add_watch(fd, os.fsencode(watch_dir), INOTIFY_EVENTS)
+            if select.select([fd], [], [], poll_interval)[0]:
+                # A forge build writes many files, so wait until it has gone quiet
+                while select.select([fd], [], [], debounce)[0]:
+                    try:
+                        os.read(fd, 65536)
+                    except BlockingIOError:
+                        pass
+            yield
+    finally:
+        os.close(fd)
+
+def file_fingerprint(path):
+    """Returns the (mtime, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def write_if_changed(path, content):
+    """Atomically writes content to path unless it already holds exactly that. Returns True if written."""
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    tmp_path = f"{path}.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+def watch_main(argv):
+    """
+    Watches the forge artifacts of every contract in the upgrade configs in the live Optimism checkout
+    and rewrites --output, and with --copy-contract-bytecode the stored bytecode, whenever a rebuild
+    changes them. Only the sections of changed contracts are derived and rendered again.
+    """
+    parser = argparse.ArgumentParser(prog="gen_predeploy_docs.py watch", description="Re-render the upgrade transaction docs whenever the contracts are rebuilt in the Optimism checkout.")
+    parser.add_argument("--upgrade-config", type=str, nargs="+", required=True, help="Path to the upgrade config file(s) (e.g., scripts/upgrades/jovian.sh)")
+    parser.add_argument("--optimism-repo-path", type=str, required=True, help="Path to the Optimism checkout you are building in; its forge-artifacts are watched as is.")
+    parser.add_argument("--output", type=str, required=True, help="Markdown file the rendered sections are written to, e.g. a page previewed with `mdbook serve`.")
+    add_gas_estimation_args(parser)
+    parser.add_argument("--copy-contract-bytecode", action="store_true", help="Store the contract bytecode and update the data path files on each change.")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between checks for changes without inotify, and between rechecks of the watched directories with it.")
+    parser.add_argument("--debounce", type=float, default=0.1, help="Seconds a build must be quiet for before its artifacts are read.")
+    add_template_args(parser)
+    add_trace_args(parser)
+
+    args = parser.parse_args(argv)
+    start_tracing(args.trace)
+    gas_settings = gas_estimation_settings(parser, args)
+    ensure_dependencies()
+    validate_repo(args.optimism_repo_path)
+
+    contract_jobs = upgrade_contract_jobs(load_upgrade_configs(args.upgrade_config), args)
+    artifacts_root = os.path.join(args.optimism_repo_path, CONTRACTS_BEDROCK_DIR, "forge-artifacts")
+    watch_dirs = [artifacts_root] + sorted({os.path.dirname(os.path.join(args.optimism_repo_path, forge_artifact_path(job["contract_name"])))
+                                            for job in contract_jobs})
+    fingerprints = [None] * len(contract_jobs)
+    sections = [""] * len(contract_jobs)
+    reported_missing = []
+
+    info(f"Watching the artifacts of {len(contract_jobs)} contracts under {artifacts_root}, writing {args.output}. Press Ctrl-C to stop.")
+    try:
+        for _ in itertools.chain([None], watch_for_changes(watch_dirs, args.poll_interval, args.debounce)):
+            start = time.perf_counter()
+            rendered = 0
+            for index, job in enumerate(contract_jobs):
+                path = forge_artifact_path(job["contract_name"])
+                fingerprint = file_fingerprint(os.path.join(args.optimism_repo_path, path))
+                if fingerprint is None or fingerprint == fingerprints[index]:
+                    continue
+                try:
+                    reload_artifact(path, args.optimism_repo_path)
+                except (OSError, KeyError, TypeError, ValueError) as e:
+                    # Most likely still being written; the next event or poll retries it
+                    warning(f"Warning: Could not read {path}: {e}")
+                    continue
+                try:
+                    with trace_phase("rerender", contract=job["contract_name"]):
+                        sections[index] = render_template(derive_contract_params(
+                            args.optimism_repo_path, job["fork_name"], job["contract_name"], job["from_address"],
+                            job["from_address_nonce"], job["git_commit_hash"], gas_settings, job["constructor_args"],
+                            job["proxy_address"], args.copy_contract_bytecode, job["command"], args.optimism_repo_path),
+                            args.template_path)
+                except (OSError, RuntimeError, ValueError, SystemExit) as e:
+                    # e.g. the RPC is unreachable or reverts the estimate; the fingerprint stays unset so the next event retries
+                    reason = f"exited with code {e.code}" if isinstance(e, SystemExit) else e
+                    warning(f"Warning: Could not derive {job['contract_name']}, retrying on the next change: {reason}")
+                    continue
+                fingerprints[index] = fingerprint
+                rendered += 1
+            if rendered and write_if_changed(args.output, "".join(sections)):
+                success(f"Re-rendered {rendered} of {len(contract_jobs)} sections into {args.output} in {(time.perf_counter() - start) * 1000:.0f} ms.")
+            elif rendered:
+                info(f"Rebuilt artifacts of {rendered} contracts left {args.output} unchanged.")
+            missing = [job["contract_name"] for job in contract_jobs
+                       if file_fingerprint(os.path.join(args.optimism_repo_path, forge_artifact_path(job["contract_name"]))) is None]
+            if missing and missing != reported_missing:
+                info(f"Waiting for a build of {', '.join(missing)}...")
+            reported_missing = missing
+    except KeyboardInterrupt:
+        info("Stopped watching.")
+
+# Bytecode diffs between two commits, used to pick which predeploys an upgrade has to deploy. Differences
+# confined to solc's CBOR metadata trailer are reported apart from code changes. Immutable values are not
+# part of the comparison: forge artifacts hold zeros in every immutable slot, since the values are only
+# written by the constructor at deployment.
+
+DIFF_STATUSES = ("code", "metadata", "added", "removed", "unchanged", "missing")
+DIFF_DESCRIPTIONS = {
+    "code": "code changed",
+    "metadata": "only the metadata changed",
+    "added": "no artifact at the base commit",
+    "removed": "no artifact at the head commit",
+    "missing": "no artifact at either commit",
+}
+
+def write_upgrade_config_contracts(config_path, entries, selected_names):
+    """
+    Rewrites the `contracts` array of an upgrade config so exactly the entries in selected_names are
+    uncommented. Each rewritten entry keeps the indentation of its line and gets a line of its own.
+    """
+    with open(config_path) as f:
+        lines = f.readlines()
+    line_entries = {}
+    for entry in entries:
+        line_entries.setdefault(entry["line"], []).append(entry)
+    for index, entries_on_line in line_entries.items():
+        indent = re.match(r'[ \t]*', lines[index]).group(0)
+        lines[index] = "".join(
+            f'{indent}{"" if entry["contract_name"] in selected_names else "# "}"{entry["contract_name"]}'
+            f'{":" + entry["proxy_address"] if entry["proxy_address"] else ""}"\n'
+            for entry in entries_on_line)
+    with open(config_path, "w") as f:
+        f.writelines(lines)
+
+def split_metadata(code):
+    """Splits deployed bytecode into (code, metadata), where metadata is solc's CBOR trailer with its 2 byte length."""
+    if len(code) >= 2:
+        start = len(code) - 2 - int.from_bytes(code[-2:], "big")
+        # A CBOR map with at most 23 entries starts with 0xa0-0xb7
+        if 0 <= start < len(code) - 2 and 0xa0 <= code[start] <= 0xb7:
+            return code[:start], code[start:]
+    return code, b""
+
+def deployed_bytecode_fingerprint(artifacts_dir, contract_name):
+    """Returns the deployed bytecode and code hash of a contract's artifact, or None if it has none."""
+    path = forge_artifact_path(contract_name)
+    if not os.path.exists(os.path.join(artifacts_dir, path)):
+        return None
+    artifact = load_artifact(path, artifacts_dir)
+    with trace_phase("hash", path=path):
+        code = hex_to_bytes(artifact["deployed_bytecode"])
+        return {"code": code, "code_hash": "0x" + keccak256(code).hex()}
+
+def bytecode_change(base, head):
+    """Classifies the difference between two deployed_bytecode_fingerprint() results as one of DIFF_STATUSES."""
+    if base is None or head is None:
+        return "missing" if base is None and head is None else "added" if base is None else "removed"
+    if base["code_hash"] == head["code_hash"]:
+        return "unchanged"
+    base_code, _ = split_metadata(base["code"])
+    head_code, _ = split_metadata(head["code"])
+    return "code" if base_code != head_code else "metadata"
+
+def diff_contract(base_dir, head_dir, entry):
+    """Returns the diff result of one upgrade config entry between the artifacts in base_dir and head_dir."""
+    base = deployed_bytecode_fingerprint(base_dir, entry["contract_name"])
+    head = deployed_bytecode_fingerprint(head_dir, entry["contract_name"])
+    return {
+        "contract_name": entry["contract_name"],
+        "proxy_address": entry["proxy_address"],
+        "status": bytecode_change(base, head),
+        "base_code_hash": base and base["code_hash"],
+        "head_code_hash": head and head["code_hash"],
+    }
+
+def diff_main(argv):
+    """
+    Compares the deployed bytecode of every contract listed in an upgrade config, commented out or not,
+    between two commits and reports which ones changed. With --write-config, the contracts array of the
+    config is rewritten so that exactly the changed contracts are enabled.
+    """
+    import concurrent.futures
+    parser = argparse.ArgumentParser(prog="gen_predeploy_docs.py diff", description="Report which predeploys of an upgrade config changed between two commits.")
+    parser.add_argument("--upgrade-config", type=str, required=True, help="Path to the upgrade config file (e.g., scripts/upgrades/jovian.sh)")
+    parser.add_argument("--optimism-repo-path", type=str, required=True, help="Path to the Optimism repository directory.")
+    parser.add_argument("--base-commit", type=str, required=True, help="Commit the contracts are currently deployed from, e.g. the previous fork's GIT_COMMIT_HASH.")
+    parser.add_argument("--head-commit", type=str, default=None, help="Commit to compare against, defaults to the GIT_COMMIT_HASH of the upgrade config.")
+    parser.add_argument("--include-metadata", action="store_true", help="Also select contracts whose bytecode differs only in its metadata.")
+    parser.add_argument("--write-config", action="store_true", help="Rewrite the contracts array of the upgrade config to enable exactly the selected contracts.")
+    parser.add_argument("--report", type=str, default="-", help="Path of the JSON report, '-' for stdout.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of threads hashing artifacts, and of parallel builds.")
+    add_artifact_cache_args(parser)
+    add_trace_args(parser)
+
+    args = parser.parse_args(argv)
+    start_tracing(args.trace)
+    ensure_dependencies()
+    validate_repo(args.optimism_repo_path)
+
+    try:
+        config = parse_upgrade_config(args.upgrade_config, require_contracts=False)
+    except (OSError, ValueError) as e:
+        error(f"Failed to load upgrade config: {e}")
+        sys.exit(1)
+    entries = config["entries"]
+    head_commit = args.head_commit or config["git_commit_hash"]
+    if not entries:
+        error(f"Upgrade config {args.upgrade_config} lists no contracts.")
+        sys.exit(1)
+
+    contract_names = [entry["contract_name"] for entry in entries]
+    cache_dir, cache_max_bytes = artifact_cache_settings(args)
+    with contract_artifacts(args.optimism_repo_path, {args.base_commit: contract_names, head_commit: contract_names}, cache_dir,
+                            cache_max_bytes, jobs=args.jobs, scratch_dir=args.scratch_dir, build_mode=args.build_mode,
+                            allow_missing=True) as artifacts_dirs:
+        info(f"Comparing the deployed bytecode of {len(entries)} contracts between {args.base_commit} and {head_commit}...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            results = list(executor.map(lambda entry: diff_contract(artifacts_dirs[args.base_commit], artifacts_dirs[head_commit], entry), entries))
+
+    selected_statuses = {"code", "added"} | ({"metadata"} if args.include_metadata else set())
+    selected = [result["contract_name"] for result in results if result["status"] in selected_statuses]
+    for result in results:
+        if result["status"] != "unchanged":
+            hashes = f" ({result['base_code_hash']} -> {result['head_code_hash']})" if result["base_code_hash"] and result["head_code_hash"] else ""
+            (warning if result["status"] in selected_statuses else info)(f"{result['contract_name']}: {DIFF_DESCRIPTIONS[result['status']]}{hashes}")
+    summary = {status: sum(result["status"] == status for result in results) for status in DIFF_STATUSES}
+    success(f"{len(selected)} of {len(results)} contracts changed: " + ", ".join(f"{count} {status}" for status, count in summary.items() if count) + ".")
+
+    if args.write_config:
+        write_upgrade_config_contracts(args.upgrade_config, entries, set(selected))
+        success(f"Enabled {len(selected)} contracts in {args.upgrade_config}.")
+    report = {
+        "base_commit": args.base_commit,
+        "head_commit": head_commit,
+        "summary": summary,
+        "selected": selected,
+        "contracts": results,
+    }
+    if args.report == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "verify":
+        verify_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        watch_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "bytecode":
+        bytecode_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "diff":
+        diff_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Generate TOML config for the predeploy_upgrade Tera macro.",
+                                     epilog="Use `gen_predeploy_docs.py batch --help` to generate every contract of an upgrade config at once, "
+                                            "and `gen_predeploy_docs.py verify --help` to check the generated sections in the specs.")
+    parser.add_argument("--optimism-repo-path", type=str, required=True, help="Path to the Optimism repository directory.")
+    parser.add_argument("--fork-name", type=str, required=True, help="Name of the fork (e.g., Isthmus)")
+    parser.add_argument("--contract-name", type=str, required=True, help="Name of the contract (e.g., CrossL2Inbox)")
+    parser.add_argument("--from-address", type=str, required=True, help="Address deploying the contract")
+    parser.add_argument("--from-address-nonce", type=int, required=True, help="Nonce of the deploying address")
+    parser.add_argument("--git-commit-hash", type=str, required=True, help="Git commit hash to build contracts from.")
+    add_gas_estimation_args(parser)
+    add_preflight_args(parser)
+    parser.add_argument("--constructor-args", type=str, help="Comma-separated values for constructor arguments (e.g., 'arg1,arg2,arg3')")
+    add_template_args(parser)
+    parser.add_argument("--proxy-address", type=str, default="", help="Address of the proxy to update, find in github.com/ethereum-optimism/optimism/op-service/predeploys/addresses.go.")
+    parser.add_argument("--copy-contract-bytecode", type=bool, default=False, help="Whether to copy the contract bytecode to the data path.")
+    add_artifact_cache_args(parser)
+    add_trace_args(parser)
+
+    args = parser.parse_args()
+    start_tracing(args.trace)
+    gas_settings = gas_estimation_settings(parser, args)
+    ensure_dependencies()
+
+    cache_dir, cache_max_bytes = artifact_cache_settings(args)
+    with contextlib.ExitStack() as stack:
+        # The preflight and the RPC connection overlap the build; a strict preflight still gates it
+        stages = contract_stages(args.fork_name, args.contract_name, args.from_address, args.from_address_nonce,
+                                 args.git_commit_hash, gas_settings, args.constructor_args, args.proxy_address,
+                                 args.copy_contract_bytecode, generated_with_command(sys.argv[1:]), args.optimism_repo_path)
+        stages["preflight"] = ((), lambda _: run_preflight(args, [(f"{args.fork_name}: {args.contract_name}", args.from_address, args.from_address_nonce)]))
+        stages["artifacts_dir"] = (("preflight",) if args.preflight == "strict" else (), lambda _: stack.enter_context(contract_artifacts(
+            args.optimism_repo_path, {args.git_commit_hash: [args.contract_name]}, cache_dir, cache_max_bytes,
+            scratch_dir=args.scratch_dir, build_mode=args.build_mode))[args.git_commit_hash])
+        if gas_settings["backend"] == "rpc":
+            stages["rpc_connection"] = ((), lambda _: warm_rpc_connection(gas_settings["rpc_url"]))
+        stages["render"] = (("params",), lambda inputs: render_template(inputs["params"], args.template_path))
+        rendered_output = run_stages(stages)["render"]
         info(f"\n-- Rendered Template --")
-        rendered_output = render_template(template_data)
         print(rendered_output, end="")
         info(f"\n--- End Rendered Template ---\n")
-        if args.copy_contract_bytecode:
-            run_cmd(f"jq -r '.bytecode.object' {args.optimism_repo_path}/{forge_artifact_path_val} > ./{data_path_result}")
-            success(f"Copied contract bytecode to {data_path_result}")
-        else:
-            info(f"Final step: copy the contract bytecode to {data_path_result} with the following command:\n")
-            print(f"jq -r '.bytecode.object' {args.optimism_repo_path}/{forge_artifact_path_val} > {data_path_result}\n", file=sys.stderr)
-    finally:
-        restore_repo_state(args.optimism_repo_path)
 
 
 if __name__ == "__main__":
@@ -40,29 +40,10 @@ if [ -z "$GIT_COMMIT_HASH" ] || [ -z "$FROM_ADDRESS" ] || [ -z "$FORK_NAME" ] ||
     exit 1
 fi
 
-inc_hex() {
-  # $1 : hex string, with or without 0x
-  local hex="${1#0x}"      # remove leading “0x” if it’s there
-  # perform the add via bc
-  local next
-  next=$(printf 'obase=16; ibase=16; %s + 1\n' "$hex" | bc)
-  # print with 0x
-  printf '0x%s\n' "$next"
-}
-
-# shellcheck disable=SC2154
-for contract_pair in "${contracts[@]}"; do
-    IFS=':' read -r contract_name proxy_address <<< "$contract_pair"
-    ./run_gen_predeploy_docs.sh \
-        --optimism-repo-path ../../optimism \
-        --fork-name $FORK_NAME \
-        --contract-name "$contract_name" \
-        --from-address $FROM_ADDRESS \
-        --from-address-nonce $FROM_ADDRESS_NONCE \
-        --git-commit-hash $GIT_COMMIT_HASH \
-        --eth-rpc-url https://optimism.rpc.subquery.network/public \
-        --proxy-address "$proxy_address" \
-        --copy-contract-bytecode true
-    # increment the from address itself by 1 in hex here
-    FROM_ADDRESS=$(inc_hex "$FROM_ADDRESS")
-done
+# All contracts share GIT_COMMIT_HASH, so the generator checks out and builds once and
+# increments FROM_ADDRESS between contracts itself.
+./run_gen_predeploy_docs.sh batch \
+    --upgrade-config "$CONSTANTS_FILE" \
+    --optimism-repo-path ../../optimism \
+    --eth-rpc-url https://optimism.rpc.subquery.network/public \
+    --copy-contract-bytecode
@@ -10,6 +10,10 @@ PYTHON_SCRIPT="${SCRIPT_DIR}/gen_predeploy_docs.py"
 
 # Where to install deps
 DEPS_DIR="${SCRIPT_DIR}/.venv"
+
+# Python packages to install, and the stamp recording what was installed
+DEPS=(jinja2 pycryptodome)
+DEPS_STAMP="${DEPS_DIR}/.deps-stamp"
 # ────────────────────────────────────────────────────────────────────────────────
 
 # 0) Ensure 'uv' is available
@@ -29,9 +33,15 @@ fi
 # shellcheck disable=SC1091
 source "${DEPS_DIR}/bin/activate"
 
-# 2) Install dependencies using uv
-echo "➤ Installing dependencies…"
-uv pip install jinja2
+# 2) Install dependencies using uv, unless the stamp shows the same packages were already
+#    installed into this venv with the same Python
+STAMP="${DEPS[*]} $(readlink -f "${DEPS_DIR}/bin/python")"
+if [ ! -f "${DEPS_STAMP}" ] || [ "$(cat "${DEPS_STAMP}")" != "${STAMP}" ]; then
+  echo "➤ Installing dependencies…"
+  uv pip install "${DEPS[@]}"
+  echo "${STAMP}" > "${DEPS_STAMP}"
+fi
 
-# 3) Exec your script, passing along any args
-exec python "${PYTHON_SCRIPT}" "$@"
+# 3) Exec your script, passing along any args. Running it as a module lets Python reuse its cached
+#    bytecode instead of compiling the whole script on every invocation
+PYTHONPATH="$(dirname "${PYTHON_SCRIPT}")${PYTHONPATH:+:${PYTHONPATH}}" exec python -m "$(basename "${PYTHON_SCRIPT}" .py)" "$@"